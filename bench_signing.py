@@ -0,0 +1,55 @@
+# bench_signing.py — custo por requisição da assinatura SigV4 (antes x depois)
+# Uso: python bench_signing.py [n_iteracoes]
+#
+# "antes": o fluxo antigo de _build_s3_headers (re-hash do payload + cadeia
+#          de 4 HMACs a cada requisição).
+# "depois": SigV4Signer com chave derivada em cache e hash já calculado no
+#          enfileiramento, e a variante UNSIGNED-PAYLOAD.
+
+import sys, os, timeit, datetime, hmac, hashlib
+
+from main import SigV4Signer, UNSIGNED_PAYLOAD, aws_v4_sign, sha256_hex, iso8601_basic
+
+KEY_ID, KEY_SECRET = "AKIDEXAMPLE", "wJalrXUtnFEMI/K7MDENG+bPxRfiCYEXAMPLEKEY"
+HOST = "example.r2.cloudflarestorage.com"
+URI = "/bucket/orcamentos/2025/01/01/abcdef12-0011aabb-img.png"
+NOW = datetime.datetime(2025, 1, 1, 12, 0, 0)
+
+def legacy_sign(payload: bytes, now: datetime.datetime = NOW) -> dict:
+    """Cópia do _build_s3_headers original (sem cache, hash a cada chamada)."""
+    region, service = "auto", "s3"
+    amz_date, date_stamp = iso8601_basic(now)
+    payload_hash = sha256_hex(payload)
+    canonical_headers = f"host:{HOST}\n" f"x-amz-content-sha256:{payload_hash}\n" f"x-amz-date:{amz_date}\n"
+    signed_headers = "host;x-amz-content-sha256;x-amz-date"
+    canonical_request = "\n".join(["PUT", URI, "", canonical_headers, signed_headers, payload_hash])
+    algorithm = "AWS4-HMAC-SHA256"
+    credential_scope = f"{date_stamp}/{region}/{service}/aws4_request"
+    string_to_sign = "\n".join([algorithm, amz_date, credential_scope, hashlib.sha256(canonical_request.encode()).hexdigest()])
+    signing_key = aws_v4_sign(KEY_SECRET, date_stamp, region, service)
+    signature = hmac.new(signing_key, string_to_sign.encode(), hashlib.sha256).hexdigest()
+    return {"Authorization": f"{algorithm} Credential={KEY_ID}/{credential_scope}, SignedHeaders={signed_headers}, Signature={signature}"}
+
+def per_call_us(fn, n: int) -> float:
+    return min(timeit.repeat(fn, number=n, repeat=5)) / n * 1e6
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    signer = SigV4Signer(KEY_ID, KEY_SECRET, "auto", "s3")
+
+    # Mesma assinatura que o código antigo para o mesmo payload/instante
+    sample = os.urandom(1024)
+    assert signer.sign("PUT", HOST, URI, "", sha256_hex(sample), NOW)["Authorization"] == legacy_sign(sample)["Authorization"]
+
+    print(f"{'payload':>10} {'antes (us)':>12} {'cache+hash pronto':>18} {'UNSIGNED':>10}")
+    for size in (0, 200 * 1024, 2 * 1024 * 1024, 8 * 1024 * 1024):
+        payload = os.urandom(size)
+        digest = sha256_hex(payload)  # já calculado em enqueue_image
+        reps = max(5, n // max(1, size // (256 * 1024)))
+        before = per_call_us(lambda: legacy_sign(payload), reps)
+        after = per_call_us(lambda: signer.sign("PUT", HOST, URI, "", digest, NOW), n)
+        unsigned = per_call_us(lambda: signer.sign("PUT", HOST, URI, "", UNSIGNED_PAYLOAD, NOW), n)
+        print(f"{size // 1024:>8}KB {before:>12.1f} {after:>18.1f} {unsigned:>10.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -1,26 +1,49 @@
 import sys
 import os
-import io
 import base64
+import hashlib
 import json
+import logging
+import logging.handlers
 import mimetypes
+import random
+import tempfile
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from datetime import datetime
-from typing import List, Tuple
+from typing import Iterable, Iterator, List, Tuple, Union
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ConnectTimeoutError
 from PySide6.QtCore import (
-    Qt, QSize, QMimeData, Signal, QObject, QThread, QByteArray, QBuffer, QSettings
+    Qt, QSize, QMimeData, Signal, QObject, QThread, QByteArray, QBuffer, QSettings,
+    QRunnable, QThreadPool
 )
 from PySide6.QtGui import (
-    QGuiApplication, QDragEnterEvent, QDropEvent, QKeySequence, QPixmap, QAction
+    QGuiApplication, QDragEnterEvent, QDropEvent, QKeySequence, QPixmap, QAction,
+    QImage, QImageReader
 )
 from PySide6.QtWidgets import (
     QApplication, QWidget, QTabWidget, QVBoxLayout, QHBoxLayout, QLabel, QLineEdit,
     QPushButton, QListWidget, QListWidgetItem, QFileDialog, QMessageBox, QProgressBar,
-    QAbstractItemView, QStyle, QSpacerItem, QSizePolicy, QCheckBox
+    QAbstractItemView, QStyle, QSpacerItem, QSizePolicy, QCheckBox, QSpinBox
 )
 
 
+# ---------- Log ----------
+
+logger = logging.getLogger("floating_uploader")
+if not logger.handlers:
+    _log_handler = logging.handlers.RotatingFileHandler(
+        "floating_uploader.log", maxBytes=2 * 1024 * 1024, backupCount=2, encoding="utf-8"
+    )
+    _log_handler.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(message)s"))
+    logger.addHandler(_log_handler)
+    logger.setLevel(logging.INFO)
+
+
 # ---------- Utilidades ----------
 
 def qimage_to_png_bytes(qimg) -> bytes:
@@ -37,19 +60,355 @@ def guess_mime_from_filename(name: str) -> str:
     mtype, _ = mimetypes.guess_type(name)
     return mtype or "application/octet-stream"
 
-def png_bytes_to_base64(b: bytes) -> str:
-    return base64.b64encode(b).decode("ascii")
+def format_rate(bytes_per_s: float) -> str:
+    if bytes_per_s >= 1024 * 1024:
+        return f"{bytes_per_s / (1024 * 1024):.1f} MB/s"
+    return f"{bytes_per_s / 1024:.0f} KB/s"
+
+# Origem de uma imagem: caminho do arquivo (lido só no envio) ou bytes PNG do clipboard
+ImageSource = Union[str, bytes]
+
+def source_size(source: ImageSource) -> int:
+    return len(source) if isinstance(source, bytes) else os.path.getsize(source)
+
+def iter_source_chunks(source: ImageSource, chunk_size: int) -> Iterator[bytes]:
+    """Lê a imagem em blocos (do disco ou da memória), sem carregar o arquivo inteiro."""
+    if isinstance(source, bytes):
+        for i in range(0, len(source), chunk_size):
+            yield source[i:i + chunk_size]
+        return
+    with open(source, "rb") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+def iter_image_sources(entries: List[Tuple[str, object, dict]]) -> Iterator[Tuple[str, str, ImageSource]]:
+    """Gera (filename, mime, caminho ou bytes PNG) sob demanda, uma imagem por vez.
+
+    Itens já preparados (ver `PrepareTask`) saem direto do spool, sem
+    recodificar; os demais (ainda preparando, ou despejados do spool) são
+    lidos/codificados aqui, na thread de quem consome o gerador. Arquivos
+    sumidos já ficaram de fora no retrato (`ImageList.snapshot`): um que some
+    depois disso falha na leitura, em vez de encolher o lote em silêncio.
+    """
+    for origin, data, prepared in entries:
+        name = os.path.basename(data) if origin == "__file__" else "clipboard.png"
+        mime = guess_mime_from_filename(data) if origin == "__file__" else "image/png"
+        if prepared and prepared.get("path") and os.path.isfile(prepared["path"]):
+            yield name, mime, prepared["path"]
+        elif prepared and prepared.get("data"):
+            yield name, mime, prepared["data"]
+        elif origin == "__file__":
+            yield name, mime, data
+        else:
+            yield "clipboard.png", "image/png", qimage_to_png_bytes(data)
+
+
+# ---------- Preparação em segundo plano (payload + hash + ícone) ----------
+
+ICON_SIZE = QSize(88, 88)
+
+class ImageSpool:
+    """Payloads prontos em disco, um arquivo por SHA-256, com teto de tamanho.
+
+    A mesma imagem adicionada de novo reaproveita o arquivo. Acima de
+    `max_bytes`, `evict()` apaga do menos para o mais recentemente usado,
+    poupando os arquivos ainda na lista. Sem diretório gravável, os prints
+    preparados ficam em memória (ver `PrepareTask`).
+    """
+    MAX_BYTES = 256 * 1024 * 1024
+    CHUNK_SIZE = 1024 * 1024
+
+    def __init__(self, root: str = None, max_bytes: int = MAX_BYTES):
+        self.root = root or os.path.join(tempfile.gettempdir(), "omniforge-floating-uploader")
+        self.max_bytes = max_bytes
+        try:
+            os.makedirs(self.root, exist_ok=True)
+        except OSError:
+            self.root = None
+
+    def _commit(self, tmp: str, sha256: str, ext: str) -> str:
+        path = os.path.join(self.root, sha256 + ext)
+        if os.path.exists(path):
+            os.remove(tmp)
+            os.utime(path)
+        else:
+            os.replace(tmp, path)
+        return path
+
+    def store(self, data: bytes, ext: str) -> Tuple[str, str]:
+        """Grava bytes já codificados; retorna (caminho, sha256)."""
+        sha256 = hashlib.sha256(data).hexdigest()
+        tmp = os.path.join(self.root, f".{uuid.uuid4().hex}.part")
+        with open(tmp, "wb") as f:
+            f.write(data)
+        return self._commit(tmp, sha256, ext), sha256
+
+    def store_file(self, src: str, ext: str) -> Tuple[str, str]:
+        """Copia o arquivo em blocos calculando o SHA-256 no caminho; retorna (caminho, sha256)."""
+        h = hashlib.sha256()
+        tmp = os.path.join(self.root, f".{uuid.uuid4().hex}.part")
+        with open(src, "rb") as fin, open(tmp, "wb") as fout:
+            while True:
+                chunk = fin.read(self.CHUNK_SIZE)
+                if not chunk:
+                    break
+                h.update(chunk)
+                fout.write(chunk)
+        return self._commit(tmp, h.hexdigest(), ext), h.hexdigest()
+
+    def evict(self, keep: set):
+        if not self.root:
+            return
+        files = []
+        for entry in os.scandir(self.root):
+            if entry.is_file() and not entry.name.startswith("."):
+                st = entry.stat()
+                files.append((st.st_mtime, st.st_size, entry.path))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_bytes:
+                break
+            if path in keep:
+                continue
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+
+
+class PrepareSignals(QObject):
+    done = Signal(str, object)         # token, {"path" ou "data", "sha256", "size", "icon"}
+    failed = Signal(str, str)          # token, erro
+
+
+class PrepareTask(QRunnable):
+    """Prepara um item assim que entra na lista, fora da thread da GUI.
+
+    Prints são codificados em PNG uma única vez; arquivos são copiados em
+    blocos. Nos dois casos o SHA-256 sai no mesmo passo e o payload vai para o
+    spool, de onde todo envio (e reenvio) da lista o lê. O ícone vem de uma
+    decodificação já reduzida (QImageReader.setScaledSize), sem abrir a
+    imagem inteira.
+    """
+    def __init__(self, token: str, origin: str, data, spool: ImageSpool):
+        super().__init__()
+        self.setAutoDelete(False)
+        self.token = token
+        self.origin = origin
+        self.data = data
+        self.spool = spool
+        self.signals = PrepareSignals()
+
+    def run(self):
+        try:
+            if self.origin == "__file__":
+                result = self._prepare_file(self.data)
+            else:
+                result = self._prepare_qimage(self.data)
+            self.signals.done.emit(self.token, result)
+        except Exception as e:
+            self.signals.failed.emit(self.token, str(e))
+        finally:
+            self.data = None
+
+    def _prepare_file(self, path: str) -> dict:
+        ext = os.path.splitext(path)[1].lower()
+        if self.spool.root:
+            spooled, sha256 = self.spool.store_file(path, ext)
+        else:
+            spooled, sha256 = None, ""
+        reader = QImageReader(path)
+        reader.setAutoTransform(True)
+        size = reader.size()
+        if size.isValid():
+            reader.setScaledSize(size.scaled(ICON_SIZE, Qt.KeepAspectRatio))
+        return {"path": spooled, "sha256": sha256, "size": os.path.getsize(spooled or path), "icon": reader.read()}
+
+    def _prepare_qimage(self, qimg: QImage) -> dict:
+        png = qimage_to_png_bytes(qimg)
+        icon = qimg.scaled(ICON_SIZE, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+        if self.spool.root:
+            path, sha256 = self.spool.store(png, ".png")
+            return {"path": path, "sha256": sha256, "size": len(png), "icon": icon}
+        return {"data": png, "sha256": hashlib.sha256(png).hexdigest(), "size": len(png), "icon": icon}
+
+
+# ---------- Corpos em streaming (multipart/form-data e JSON) ----------
+
+class MultipartStream:
+    """Corpo multipart/form-data gerado sob demanda para `requests.post(data=...)`.
+
+    Uma parte JSON com os metadados e uma parte binária por imagem, lida do
+    disco em blocos de CHUNK_SIZE. Como tem `__len__`, o requests manda
+    Content-Length (sem chunked) e consome o iterador na hora de enviar: a
+    memória usada não cresce com o tamanho do lote.
+    """
+    CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, metadata: dict, images: List[Tuple[str, str, ImageSource]]):
+        self.boundary = uuid.uuid4().hex
+        self.metadata = json.dumps(metadata, ensure_ascii=False).encode("utf-8")
+        self.images = images
+
+    @property
+    def content_type(self) -> str:
+        return f"multipart/form-data; boundary={self.boundary}"
+
+    @staticmethod
+    def field_name(index: int) -> str:
+        return f"image_{index}"
+
+    def _part_header(self, name: str, content_type: str, filename: str = None) -> bytes:
+        disposition = f'form-data; name="{name}"'
+        if filename is not None:
+            safe = filename.replace("\r", "").replace("\n", "").replace('"', "%22")
+            disposition += f'; filename="{safe}"'
+        return (f"--{self.boundary}\r\n"
+                f"Content-Disposition: {disposition}\r\n"
+                f"Content-Type: {content_type}\r\n\r\n").encode("utf-8")
+
+    def _closing(self) -> bytes:
+        return f"--{self.boundary}--\r\n".encode("ascii")
+
+    def __len__(self) -> int:
+        total = len(self._part_header("payload", "application/json")) + len(self.metadata) + 2
+        for i, (fname, mime, source) in enumerate(self.images, start=1):
+            total += len(self._part_header(self.field_name(i), mime, fname)) + source_size(source) + 2
+        return total + len(self._closing())
+
+    def __iter__(self):
+        yield self._part_header("payload", "application/json")
+        yield self.metadata + b"\r\n"
+        for i, (fname, mime, source) in enumerate(self.images, start=1):
+            yield self._part_header(self.field_name(i), mime, fname)
+            yield from iter_source_chunks(source, self.CHUNK_SIZE)
+            yield b"\r\n"
+        yield self._closing()
+
+
+class JsonStream:
+    """Corpo JSON do orçamento gerado sob demanda para `requests.post(data=...)`.
+
+    Sai o mesmo documento que `json=payload` produziria, mas o base64 de cada
+    imagem é codificado em blocos enquanto o requests envia: nem o base64
+    inteiro nem o texto JSON completo existem na memória. `__len__` calcula o
+    tamanho exato (base64 = 4*ceil(n/3)) para manter o Content-Length.
+    """
+    CHUNK_SIZE = 48 * 1024  # múltiplo de 3: os blocos em base64 emendam sem padding no meio
+
+    def __init__(self, base: dict, images: List[Tuple[int, str, str, ImageSource]]):
+        self.head = (json.dumps(base)[:-1] + ', "images": [').encode("ascii")
+        self.images = images
+
+    @staticmethod
+    def _image_head(idx: int, fname: str, mime: str) -> bytes:
+        return (json.dumps({"index": idx, "filename": fname, "mime": mime})[:-1] + ', "base64": "').encode("ascii")
+
+    def __len__(self) -> int:
+        total = len(self.head) + len(b"]}") + 2 * max(0, len(self.images) - 1)
+        for idx, fname, mime, source in self.images:
+            total += len(self._image_head(idx, fname, mime)) + 4 * ((source_size(source) + 2) // 3) + len(b'"}')
+        return total
+
+    def __iter__(self):
+        yield self.head
+        for pos, (idx, fname, mime, source) in enumerate(self.images, start=1):
+            if pos > 1:
+                yield b", "
+            yield self._image_head(idx, fname, mime)
+            for chunk in iter_source_chunks(source, self.CHUNK_SIZE):
+                yield base64.b64encode(chunk)
+            yield b'"}'
+        yield b"]}"
+
+
+class ProgressStream:
+    """Envolve um corpo em streaming e mede os bytes à medida que o requests os envia.
+
+    O requests grava cada bloco no socket antes de pedir o próximo, então o que
+    já saiu do iterador é o que foi enviado (menos o bloco em trânsito).
+    `on_progress(sent, total, bytes_por_s, eta_s)` é chamado no máximo a cada
+    EMIT_INTERVAL e no último byte; a taxa é a média da janela RATE_WINDOW.
+    """
+    EMIT_INTERVAL = 0.1
+    RATE_WINDOW = 2.0
+
+    def __init__(self, body, on_progress=None):
+        self.body = body
+        self.total = len(body)
+        self.on_progress = on_progress
+        self.sent = 0
+        self.started = None
+        self.finished = None
+        self._samples = []
+        self._last_emit = 0.0
+
+    def __len__(self) -> int:
+        return self.total
+
+    def rate(self) -> float:
+        if len(self._samples) < 2:
+            return 0.0
+        (t0, b0), (t1, b1) = self._samples[0], self._samples[-1]
+        return (b1 - b0) / (t1 - t0) if t1 > t0 else 0.0
+
+    def __iter__(self):
+        self.started = time.monotonic()
+        self._samples = [(self.started, 0)]
+        for chunk in self.body:
+            yield chunk
+            self.sent += len(chunk)
+            now = time.monotonic()
+            self._samples.append((now, self.sent))
+            while now - self._samples[0][0] > self.RATE_WINDOW and len(self._samples) > 2:
+                self._samples.pop(0)
+            if self.on_progress and (now - self._last_emit >= self.EMIT_INTERVAL or self.sent >= self.total):
+                self._last_emit = now
+                rate = self.rate()
+                eta = (self.total - self.sent) / rate if rate > 0 else -1.0
+                self.on_progress(self.sent, self.total, rate, eta)
+        self.finished = time.monotonic()
 
 
 # ---------- Worker de Envio (Thread) ----------
 
 class SenderWorker(QObject):
+    """Envia o orçamento ao webhook numa thread própria.
+
+    `images` é consumido aqui, de forma preguiçosa (ver `ImageList.collect_images`):
+    cada print só vira PNG quando chega a sua vez. No envio único, as imagens do
+    clipboard vão para um spool temporário para o tamanho total ser conhecido;
+    o corpo é transmitido em blocos, nos dois formatos.
+
+    `transport` escolhe o formato: "json" (imagens em base64 dentro de um
+    documento JSON, compatível com webhooks antigos) ou "multipart" (parte
+    JSON com os metadados + uma parte binária por imagem).
+
+    As requisições saem de uma `requests.Session` (keep-alive, pool de
+    conexões). No modo encadeado, cada imagem tem suas próprias novas
+    tentativas; com `parallel` > 1, até `parallel` imagens sobem ao mesmo
+    tempo e a ordem fica por conta do receptor: cada requisição leva
+    `batch` (id, total) e o `index` da imagem, e no fim sai um
+    `"event": "batch_complete"` só depois de todas confirmadas.
+    """
     progressed = Signal(int)           # progresso 0..100
+    transfer = Signal(float, float)    # envio único: bytes/s atuais, ETA em s (-1 = desconhecido)
     finished = Signal(bool, str)       # sucesso, mensagem
+    PREPARE_SHARE = 10                 # % da barra para preparar as imagens no envio único
+    MAX_ATTEMPTS = 3                   # tentativas por requisição (encadeado e "batch_complete")
+    RETRY_BACKOFF = (0.5, 8.0)         # base, teto (s) do backoff com jitter
+    RETRY_STATUS = {408, 425, 429, 500, 502, 503, 504}
     def __init__(self, webhook_url: str, seller_name: str, client_name: str,
                  phone: str, conversation_id: str,
-                 images: List[Tuple[str, str, str]],  # (filename, mime, base64)
-                 send_chained_requests: bool = False):
+                 images: Iterable[Tuple[str, str, ImageSource]],  # (filename, mime, caminho ou bytes)
+                 send_chained_requests: bool = False,
+                 transport: str = "json",
+                 image_count: int = 0,
+                 parallel: int = 1):
         super().__init__()
         self.webhook_url = webhook_url
         self.seller_name = seller_name
@@ -58,9 +417,14 @@ class SenderWorker(QObject):
         self.conversation_id = conversation_id
         self.images = images
         self.send_chained_requests = send_chained_requests
+        self.transport = transport
+        self.image_count = image_count or (len(images) if hasattr(images, "__len__") else 0)
+        self.parallel = max(1, parallel)
+        self.batch_id = None
+        self.session = None
 
     def _payload_base(self):
-        return {
+        payload = {
             "seller_name": self.seller_name or "",
             "timestamp": datetime.utcnow().isoformat() + "Z",
             "client": {
@@ -69,61 +433,183 @@ class SenderWorker(QObject):
                 "conversation_id": self.conversation_id,
             }
         }
+        if self.batch_id:
+            payload["batch"] = {"id": self.batch_id, "total": self.image_count}
+        return payload
+
+    def _open_session(self) -> requests.Session:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.parallel)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    def _progress(self, done: int):
+        self.progressed.emit(min(100, int(done * 100 / max(1, self.image_count))))
+
+    def _post(self, images: List[Tuple[int, str, str, ImageSource]], timeout: int, on_progress=None):
+        """POST de um lote de imagens, com o corpo em streaming no formato escolhido.
+
+        Cada POST vai para o log com bytes, tempo de envio do corpo, tempo total
+        (até a resposta) e a vazão sobre cada um: o envio termina quando o último
+        bloco entra no buffer do socket, então a vazão total é a mais conservadora.
+        """
+        if self.transport == "multipart":
+            # Metadados + imagens como arquivos (sem base64)
+            payload = self._payload_base()
+            payload["images"] = [{
+                "index": idx,
+                "filename": fname,
+                "mime": mime,
+                "field": MultipartStream.field_name(pos)
+            } for pos, (idx, fname, mime, _) in enumerate(images, start=1)]
+            body = MultipartStream(payload, [(fname, mime, source) for _, fname, mime, source in images])
+            content_type = body.content_type
+        else:
+            body = JsonStream(self._payload_base(), images)
+            content_type = "application/json"
+        body = ProgressStream(body, on_progress)
+        t0 = time.monotonic()
+        try:
+            r = self.session.post(self.webhook_url, data=body, headers={"Content-Type": content_type}, timeout=timeout)
+        except requests.RequestException as e:
+            logger.warning(f"[envio] falhou após {body.sent}/{body.total} bytes em {time.monotonic() - t0:.2f}s: {e}")
+            raise
+        total_s = time.monotonic() - t0
+        upload_s = (body.finished or time.monotonic()) - (body.started or t0)
+        logger.info(
+            f"[envio] transporte={self.transport} imagens={len(images)} bytes={body.sent} HTTP {r.status_code} "
+            f"envio={upload_s:.2f}s total={total_s:.2f}s vazão_envio={body.sent / upload_s if upload_s > 0 else 0:.0f} B/s "
+            f"vazão_total={body.sent / total_s if total_s > 0 else 0:.0f} B/s"
+        )
+        return r
+
+    def _on_bytes(self, sent: int, total: int, rate: float, eta: float):
+        share = 100 - self.PREPARE_SHARE
+        self.progressed.emit(min(99, self.PREPARE_SHARE + int(sent * share / max(1, total))))
+        self.transfer.emit(rate, eta)
+
+    def _with_retry(self, send):
+        """Chama `send()` (que devolve a resposta) com novas tentativas em falhas transitórias.
+
+        Falha ao estabelecer a conexão (timeout, recusa, DNS) e HTTP
+        408/425/429/5xx voltam após backoff exponencial com jitter. Timeout de
+        leitura e conexão caída no meio ("Connection aborted") não voltam: o
+        receptor pode já ter o corpo inteiro, e repetir duplicaria o orçamento.
+        Os demais erros HTTP encerram na hora (raise_for_status).
+        """
+        for attempt in range(1, self.MAX_ATTEMPTS + 1):
+            try:
+                r = send()
+                if r.status_code not in self.RETRY_STATUS or attempt == self.MAX_ATTEMPTS:
+                    r.raise_for_status()
+                    return r
+            except requests.ConnectionError as e:
+                if attempt == self.MAX_ATTEMPTS or not self._never_sent(e):
+                    raise
+            base, cap = self.RETRY_BACKOFF
+            time.sleep(random.uniform(0, min(cap, base * 2 ** (attempt - 1))))
+
+    @staticmethod
+    def _never_sent(e: requests.ConnectionError) -> bool:
+        """A conexão nem chegou a abrir, então nada foi entregue (o urllib3 embrulha o motivo)."""
+        reason = getattr(e.args[0], "reason", None) if e.args else None
+        return isinstance(e, requests.ConnectTimeout) or isinstance(reason, ConnectTimeoutError)
+
+    def _send_image(self, image: Tuple[int, str, str, ImageSource]):
+        self._with_retry(lambda: self._post([image], timeout=30))
+
+    def _send_chained(self) -> int:
+        """Uma requisição por imagem; em paralelo, com no máximo `parallel` em voo."""
+        if self.parallel == 1:
+            sent = 0
+            for idx, (fname, mime, source) in enumerate(self.images, start=1):
+                self._send_image((idx, fname, mime, source))
+                sent = idx
+                self._progress(idx)
+            return sent
+
+        self.batch_id = uuid.uuid4().hex
+        sent = 0
+        with ThreadPoolExecutor(max_workers=self.parallel) as pool:
+            pending = set()
+            # O gerador é consumido só aqui (thread do worker), no ritmo das vagas:
+            # na memória ficam no máximo `parallel` imagens
+            for idx, (fname, mime, source) in enumerate(self.images, start=1):
+                if len(pending) >= self.parallel:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for f in done:
+                        f.result()
+                        sent += 1
+                        self._progress(sent)
+                pending.add(pool.submit(self._send_image, (idx, fname, mime, source)))
+            for f in wait(pending)[0]:
+                f.result()
+                sent += 1
+                self._progress(sent)
+
+        # Todas confirmadas: o receptor já pode montar o orçamento na ordem dos índices
+        payload = self._payload_base()
+        payload["batch"]["total"] = sent
+        payload["event"] = "batch_complete"
+        self._with_retry(lambda: self.session.post(self.webhook_url, json=payload, timeout=30))
+        return sent
+
+    def _spool(self, source: ImageSource, spool_dir: str, idx: int) -> ImageSource:
+        """Print já codificado vai para o disco: na memória fica uma imagem por vez."""
+        if not isinstance(source, bytes):
+            return source
+        path = os.path.join(spool_dir, f"{idx}.png")
+        with open(path, "wb") as f:
+            f.write(source)
+        return path
 
     def run(self):
+        self.session = self._open_session()
         try:
-            total_steps = len(self.images) if self.send_chained_requests else 1
-            total_steps = max(1, total_steps)
             # Envio encadeado (requisições separadas) opcional
             if self.send_chained_requests:
-                for idx, (fname, mime, b64) in enumerate(self.images, start=1):
-                    payload = self._payload_base()
-                    payload["images"] = [{
-                        "index": idx,
-                        "filename": fname,
-                        "mime": mime,
-                        "base64": b64
-                    }]
-                    r = requests.post(self.webhook_url, json=payload, timeout=30)
-                    r.raise_for_status()
-                    self.progressed.emit(int(idx * 100 / total_steps))
-                self.finished.emit(True, f"{len(self.images)} imagem(ns) enviada(s) com sucesso (encadeado).")
+                sent = self._send_chained()
+                suffix = "encadeado" if self.parallel == 1 else f"encadeado, {self.parallel} em paralelo"
+                self.finished.emit(True, f"{sent} imagem(ns) enviada(s) com sucesso ({suffix}).")
                 return
 
             # Envio único com “arquivos separados” em um array ordenado
-            images_obj = []
-            for i, (fname, mime, b64) in enumerate(self.images, start=1):
-                images_obj.append({
-                    "index": i,
-                    "filename": fname,
-                    "mime": mime,
-                    "base64": b64
-                })
-
-            payload = self._payload_base()
-            payload["images"] = images_obj
-
-            r = requests.post(self.webhook_url, json=payload, timeout=60)
+            with tempfile.TemporaryDirectory(prefix="orcamento-") as spool_dir:
+                images = []
+                for idx, (fname, mime, source) in enumerate(self.images, start=1):
+                    images.append((idx, fname, mime, self._spool(source, spool_dir, idx)))
+                    self.progressed.emit(int(idx * self.PREPARE_SHARE / max(1, self.image_count)))
+                r = self._post(images, timeout=60, on_progress=self._on_bytes)
             r.raise_for_status()
             self.progressed.emit(100)
-            self.finished.emit(True, f"{len(self.images)} imagem(ns) enviada(s) com sucesso.")
+            suffix = " (multipart)" if self.transport == "multipart" else ""
+            self.finished.emit(True, f"{len(images)} imagem(ns) enviada(s) com sucesso{suffix}.")
         except requests.RequestException as e:
             self.finished.emit(False, f"Falha no envio HTTP: {e}")
         except Exception as e:
             self.finished.emit(False, f"Erro inesperado: {e}")
+        finally:
+            self.session.close()
 
 
 # ---------- Widget da Lista de Imagens (colagem/arrastar-soltar) ----------
 
 class ImageList(QListWidget):
     images_changed = Signal()
+    PREPARED_ROLE = Qt.UserRole + 1    # dict do PrepareTask (payload no spool, sha256, tamanho)
+    TOKEN_ROLE = Qt.UserRole + 2       # liga o item ao PrepareTask (sem guardar o QListWidgetItem)
 
     def __init__(self, parent=None):
         super().__init__(parent)
         self.setAcceptDrops(True)
         self.setSelectionMode(QAbstractItemView.ExtendedSelection)
         self.setDragDropMode(QAbstractItemView.NoDragDrop)
-        self.setIconSize(QSize(88, 88))
+        self.setIconSize(ICON_SIZE)
+        self.spool = ImageSpool()
+        self._pool = QThreadPool.globalInstance()
+        self._preparing = {}           # token -> PrepareTask, até o sinal chegar
+        self._held = {}                # caminho no spool -> envios em andamento que o leem
         # Ação de deletar selecionados (Del)
         delete_action = QAction("Remover", self)
         delete_action.setShortcut(QKeySequence.Delete)
@@ -170,66 +656,136 @@ class ImageList(QListWidget):
         super().keyPressEvent(e)
 
     def _add_qimage(self, qimg, suggested_name="clipboard.png"):
-        # Gera thumbnail e item
-        pix = QPixmap.fromImage(qimg) if hasattr(qimg, "size") else QPixmap()
-        icon = self.style().standardIcon(QStyle.SP_FileIcon) if pix.isNull() else QPixmap(pix).scaled(88, 88, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+        # Item na hora com ícone provisório; PNG, hash e miniatura saem do PrepareTask
+        if isinstance(qimg, QPixmap):
+            qimg = qimg.toImage()
         item = QListWidgetItem()
-        if isinstance(icon, QPixmap):
-            item.setIcon(icon)
-        else:
-            item.setIcon(icon)
+        item.setIcon(self.style().standardIcon(QStyle.SP_FileIcon))
         item.setText(suggested_name)
-        item.setData(Qt.UserRole, ("__clipboard__", qimg))  # marcador de origem
+        qimg = qimg.copy() if isinstance(qimg, QImage) else QImage()  # desacopla do clipboard
+        item.setData(Qt.UserRole, ("__clipboard__", qimg))  # marcador de origem; vira None quando o PNG estiver no spool
         self.addItem(item)
+        if not qimg.isNull():
+            self._prepare(item, "__clipboard__", qimg)
 
     def _add_file_path(self, path: str):
         if not os.path.isfile(path):
             return
-        pix = QPixmap(path)
-        icon = self.style().standardIcon(QStyle.SP_FileIcon) if pix.isNull() else pix.scaled(88, 88, Qt.KeepAspectRatio, Qt.SmoothTransformation)
         item = QListWidgetItem()
-        if isinstance(icon, QPixmap):
-            item.setIcon(icon)
-        else:
-            item.setIcon(icon)
+        item.setIcon(self.style().standardIcon(QStyle.SP_FileIcon))
         item.setText(os.path.basename(path))
         item.setToolTip(path)
         item.setData(Qt.UserRole, ("__file__", path))
         self.addItem(item)
+        self._prepare(item, "__file__", path)
 
-    def remove_selected(self):
-        for it in self.selectedItems():
+    def _prepare(self, item: QListWidgetItem, origin: str, data):
+        token = uuid.uuid4().hex
+        task = PrepareTask(token, origin, data, self.spool)
+        task.signals.done.connect(self._on_prepared)
+        task.signals.failed.connect(self._on_prepare_failed)
+        item.setData(self.TOKEN_ROLE, token)
+        self._preparing[token] = task
+        self._pool.start(task)
+
+    def _item_for(self, token: str):
+        for i in range(self.count()):
+            if self.item(i).data(self.TOKEN_ROLE) == token:
+                return self.item(i)
+        return None
+
+    def _on_prepared(self, token: str, result: dict):
+        self._preparing.pop(token, None)
+        item = self._item_for(token)
+        if item is None:
+            return  # removido enquanto preparava
+        icon = result.pop("icon")
+        if not icon.isNull():
+            item.setIcon(QPixmap.fromImage(icon))
+        item.setData(self.PREPARED_ROLE, result)
+        origin, _ = item.data(Qt.UserRole)
+        if origin == "__clipboard__":
+            item.setData(Qt.UserRole, (origin, None))  # o print em resolução cheia sai da memória; vale o spool
+        keep = {p.get("path") for p in self._prepared_items()} | set(self._held)
+        self.spool.evict(keep=keep)
+
+    def _on_prepare_failed(self, token: str, err: str):
+        # Sem preparo o envio lê/codifica o original, como antes
+        self._preparing.pop(token, None)
+
+    def _prepared_items(self) -> List[dict]:
+        return [p for p in (self.item(i).data(self.PREPARED_ROLE) for i in range(self.count())) if p]
+
+    def _cancel_prepare(self, items: List[QListWidgetItem]):
+        # Tarefa que nem começou sai do pool; a que já roda termina e o resultado é ignorado
+        # (continua em _preparing até o sinal: o QRunnable não pode ser coletado em execução)
+        for it in items:
+            task = self._preparing.get(it.data(self.TOKEN_ROLE))
+            if task is not None and self._pool.tryTake(task):
+                del self._preparing[it.data(self.TOKEN_ROLE)]
+
+    def hold(self, entries: List[Tuple[str, object, dict]]):
+        """Protege do despejo os arquivos do spool que um envio vai ler (ver `release`)."""
+        for _, _, prepared in entries:
+            if prepared and prepared.get("path"):
+                self._held[prepared["path"]] = self._held.get(prepared["path"], 0) + 1
+
+    def release(self, entries: List[Tuple[str, object, dict]]):
+        for _, _, prepared in entries:
+            path = prepared.get("path") if prepared else None
+            if path in self._held:
+                self._held[path] -= 1
+                if not self._held[path]:
+                    del self._held[path]
+
+    def remove_items(self, items: List[QListWidgetItem]):
+        """Único caminho de remoção: cancela o preparo pendente antes de tirar da lista."""
+        self._cancel_prepare(items)
+        for it in items:
             self.takeItem(self.row(it))
+
+    def trim(self, limit: int):
+        self.remove_items([self.item(i) for i in range(limit, self.count())])
+
+    def remove_selected(self):
+        self.remove_items(self.selectedItems())
         self.images_changed.emit()
 
     def clear_all(self):
+        self._cancel_prepare([self.item(i) for i in range(self.count())])
         self.clear()
         self.images_changed.emit()
 
-    def collect_images(self) -> List[Tuple[str, str, str]]:
-        """Retorna lista [(filename, mime, base64), ...] em ordem."""
-        result = []
+    def snapshot(self, limit: int = None) -> List[Tuple[str, object, dict]]:
+        """Retrato da lista (origem, dado, preparo) feito na thread da GUI.
+
+        Pixmaps viram QImage (que pode ser usada em outra thread) e arquivos que
+        sumiram do disco, sem cópia no spool, ficam de fora: `len()` do retrato
+        é o total real do lote.
+        """
+        entries = []
         for i in range(self.count()):
-            it = self.item(i)
-            origin, data = it.data(Qt.UserRole)
-            if origin == "__file__":
-                path = data
-                try:
-                    with open(path, "rb") as f:
-                        raw = f.read()
-                    b64 = base64.b64encode(raw).decode("ascii")
-                    mime = guess_mime_from_filename(path)
-                    result.append((os.path.basename(path), mime, b64))
-                except Exception:
-                    # Ignora arquivo inválido
-                    continue
-            else:
-                # clipboard QImage
-                qimg = data
-                png = qimage_to_png_bytes(qimg)
-                b64 = png_bytes_to_base64(png)
-                result.append(("clipboard.png", "image/png", b64))
-        return result
+            origin, data = self.item(i).data(Qt.UserRole)
+            prepared = self.item(i).data(self.PREPARED_ROLE)
+            spooled = bool(prepared and (prepared.get("data") or
+                                         (prepared.get("path") and os.path.isfile(prepared["path"]))))
+            if not spooled and (data is None or origin == "__file__" and not os.path.isfile(data)):
+                continue
+            if origin != "__file__" and isinstance(data, QPixmap):
+                data = data.toImage()
+            entries.append((origin, data, prepared))
+            if limit is not None and len(entries) >= limit:
+                break
+        return entries
+
+    def collect_images(self, entries: List[Tuple[str, object, dict]] = None) -> Iterator[Tuple[str, str, ImageSource]]:
+        """Gerador preguiçoso [(filename, mime, caminho ou bytes PNG), ...] em ordem.
+
+        Itens já preparados saem do spool como estão, inclusive em reenvios;
+        ler arquivos e codificar prints ainda não preparados fica para quem
+        consumir o gerador — o SenderWorker, uma imagem por vez.
+        """
+        return iter_image_sources(self.snapshot() if entries is None else entries)
 
 
 # ---------- Janela Principal ----------
@@ -251,6 +807,8 @@ class FloatingUploader(QWidget):
 
         # Estado arraste
         self._drag_pos = None
+        # Itens do envio em andamento (arquivos do spool protegidos do despejo)
+        self._sending_entries = []
 
         # QSettings
         self.settings = QSettings(self.ORG, self.APP)
@@ -317,6 +875,12 @@ class FloatingUploader(QWidget):
         self.chk_chain = QCheckBox("Enviar em requisições separadas (encadeadas)")
         self.chk_chain.setToolTip("Se marcado, envia uma requisição por imagem, na ordem.")
         actions.addWidget(self.chk_chain)
+        self.chk_multipart = QCheckBox("Enviar imagens como arquivos (multipart)")
+        self.chk_multipart.setToolTip(
+            "Envia multipart/form-data: uma parte JSON com os dados do cliente e um arquivo por imagem, "
+            "sem base64 (cerca de 33% menos bytes). Desmarque para webhooks que esperam o JSON antigo."
+        )
+        actions.addWidget(self.chk_multipart)
         m.addLayout(actions)
 
         btn_add.clicked.connect(self.add_files)
@@ -352,6 +916,18 @@ class FloatingUploader(QWidget):
         cfg_row1.addWidget(self.in_webhook, 2)
         c.addLayout(cfg_row1)
 
+        cfg_row2 = QHBoxLayout()
+        self.in_parallel = QSpinBox()
+        self.in_parallel.setRange(1, 8)
+        self.in_parallel.setToolTip(
+            "Quantas imagens sobem ao mesmo tempo no envio encadeado. Acima de 1, cada requisição leva "
+            "o índice da imagem e o lote termina com um aviso \"batch_complete\"."
+        )
+        cfg_row2.addWidget(QLabel("Requisições simultâneas (envio encadeado):"))
+        cfg_row2.addWidget(self.in_parallel)
+        cfg_row2.addStretch(1)
+        c.addLayout(cfg_row2)
+
         cfg_btns = QHBoxLayout()
         self.btn_save = QPushButton("Salvar configurações")
         self.btn_save.clicked.connect(self.save_settings)
@@ -423,17 +999,20 @@ class FloatingUploader(QWidget):
     def load_settings(self):
         self.in_seller.setText(self.settings.value("seller_name", "", str))
         self.in_webhook.setText(self.settings.value("webhook_url", "", str))
+        self.chk_multipart.setChecked(self.settings.value("transport", "json", str) == "multipart")
+        self.in_parallel.setValue(self.settings.value("chain_parallel", 1, int))
 
     def save_settings(self):
         self.settings.setValue("seller_name", self.in_seller.text().strip())
         self.settings.setValue("webhook_url", self.in_webhook.text().strip())
+        self.settings.setValue("transport", "multipart" if self.chk_multipart.isChecked() else "json")
+        self.settings.setValue("chain_parallel", self.in_parallel.value())
         QMessageBox.information(self, "Configurações", "Configurações salvas com sucesso.")
 
     # ----- Lógica -----
     def _enforce_limit(self):
         # Garante no máximo 10 itens, removendo excedentes do fim
-        while self.img_list.count() > 10:
-            self.img_list.takeItem(self.img_list.count() - 1)
+        self.img_list.trim(10)
         self.progress.setValue(0)
 
     def add_files(self):
@@ -469,14 +1048,22 @@ class FloatingUploader(QWidget):
             QMessageBox.warning(self, "Campos obrigatórios", msg)
             return
 
-        images = self.img_list.collect_images()
-        if len(images) > 10:
-            images = images[:10]  # salvaguarda
+        # Gerador: nada é lido nem codificado aqui, e sim na thread do worker
+        entries = self.img_list.snapshot(limit=10)  # salvaguarda
+        if not entries:
+            QMessageBox.warning(self, "Sem imagens", "Os arquivos da lista não existem mais no disco.")
+            return
+        images = self.img_list.collect_images(entries)
+        image_count = len(entries)
+        self._sending_entries = entries
+        self.img_list.hold(entries)      # o spool não despeja o que este envio ainda vai ler
+        transport = "multipart" if self.chk_multipart.isChecked() else "json"
+        self.settings.setValue("transport", transport)
 
         # Desliga botões durante envio
         self.btn_send.setEnabled(False)
         self.btn_close2.setEnabled(False)
-        self.progress.setValue(5)
+        self.progress.setValue(0)
 
         # Prepara Worker/Thread
         self.thread = QThread()
@@ -487,18 +1074,29 @@ class FloatingUploader(QWidget):
             phone=self.in_phone.text().strip(),
             conversation_id=self.in_conversation.text().strip(),
             images=images,
-            send_chained_requests=self.chk_chain.isChecked()
+            send_chained_requests=self.chk_chain.isChecked(),
+            transport=transport,
+            image_count=image_count,
+            parallel=self.in_parallel.value()
         )
         self.worker.moveToThread(self.thread)
         self.thread.started.connect(self.worker.run)
         self.worker.progressed.connect(self.progress.setValue)
+        self.worker.transfer.connect(self._on_transfer)
         self.worker.finished.connect(self._on_send_finished)
         self.worker.finished.connect(self.thread.quit)
         self.worker.finished.connect(self.worker.deleteLater)
         self.thread.finished.connect(self.thread.deleteLater)
         self.thread.start()
 
+    def _on_transfer(self, rate: float, eta: float):
+        eta_txt = f" · ~{eta:.0f}s" if eta >= 0 else ""
+        self.progress.setFormat(f"%p% · {format_rate(rate)}{eta_txt}")
+
     def _on_send_finished(self, success: bool, message: str):
+        self.img_list.release(self._sending_entries)
+        self._sending_entries = []
+        self.progress.setFormat("%p%")
         self.btn_send.setEnabled(True)
         self.btn_close2.setEnabled(True)
         if success:
@@ -517,5 +1115,3 @@ def main():
 
 if __name__ == "__main__":
     main()
-</final_file_content>
-</write_to_file>
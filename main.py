@@ -1,29 +1,56 @@
 # main.py — OmniForge App Orçamento (build unificado)
 # - Janela ultra-estreita responsiva (resize por bordas + grips + modo compacto)
 # - Minimiza para bandeja (system tray)
-# - Enfileira até 10 imagens; upload individual ao R2 (S3) com AWS SigV4
-# - Payload ao webhook envia SOMENTE links públicos
-# - Após webhook OK, deleta os objetos do bucket (limpeza)
+# - Fila de imagens em lista virtualizada (modelo/visão; limite configurável) com os bytes
+#   em spool no disco, não na memória (codificadas em segundo plano: PNG p/ prints, JPEG/WebP p/ fotos,
+#   com redução de resolução e orçamento de bytes; arquivos arrastados já dentro da política
+#   sobem como estão, sem recodificar); upload concorrente ao R2 (S3) com AWS SigV4 (limite configurável)
+# - Miniaturas geradas no worker e guardadas em cache no disco (por SHA-256, LRU)
+# - Upload antecipado opcional: a imagem sobe assim que é enfileirada; remover cancela o
+#   upload em voo (e apaga o objeto parcial) e ▲ passa a imagem para o topo da fila de upload
+# - PUT/DELETE com novas tentativas (erros transitórios, backoff + jitter) e hedge opcional
+#   no p95; webhook com links faltando só se o vendedor aceitar
+# - Imagens grandes sobem em partes (S3 multipart) paralelas, com retomada por parte
+# - Limite de banda global para os uploads (balde de fichas), fixo ou automático pelo RTT,
+#   para não engasgar a chamada do vendedor
+# - Vários orçamentos em paralelo: cada envio é um job independente, com orçamento global de
+#   uploads (FIFO entre jobs) e lista de progresso por orçamento
+# - Payload ao webhook envia SOMENTE links públicos, via caixa de saída persistente com
+#   novas tentativas (backoff exponencial + jitter) e reenvio quando a conexão volta
+# - Após webhook OK, deleta os objetos do bucket em lote (DeleteObjects; modo adiado opcional)
+# - Chaves por conteúdo (opcional): a chave vem do SHA-256 e um índice local reaproveita o objeto
+#   entre orçamentos (reenvio sem PUT); a limpeza vira contagem de referências + TTL
+# - Diário em disco (SQLite + imagens em spool): fila e envios interrompidos são retomados
 # - Sem teste de S3 na UI; Webhook com teste seguro
+# - Transporte R2 com TLS pré-configurado, conexão aquecida, HTTP/2 (ou keep-alive HTTP/1.1)
+#   e tempos por requisição no log
 # - Tratamento robusto de slots para evitar fechamentos abruptos
+# - Métricas por etapa (codificação, assinatura, PUT, webhook, DELETE) com p50/p95 na aba Diagnóstico
 # - Logs sem vazar segredos
 
-import os, sys, uuid, datetime, hmac, hashlib, json
+import os, sys, uuid, datetime, hmac, hashlib, json, base64, sqlite3, time, random, threading
+from collections import deque
+import xml.etree.ElementTree as ET
+from xml.sax.saxutils import escape as xml_escape
 from pathlib import Path
 from urllib.parse import quote
 from typing import Optional, List
 
 from PySide6.QtCore import (
     Qt, QPoint, QByteArray, QBuffer, QIODevice, QUrl, Slot, Signal,
-    QSettings, QTimer, QEvent, QSize, QRect
+    QSettings, QTimer, QEvent, QSize, QRect, QObject, QRunnable, QThreadPool, QThread,
+    QStandardPaths, QAbstractListModel, QModelIndex, QFile
 )
 from PySide6.QtGui import (
-    QGuiApplication, QPixmap, QShortcut, QKeySequence, QIcon, QImage, QAction
+    QGuiApplication, QPixmap, QShortcut, QKeySequence, QIcon, QImage, QAction,
+    QImageWriter, QImageReader, QPainter, QColor, QCursor
 )
 from PySide6.QtWidgets import (
     QApplication, QWidget, QLabel, QVBoxLayout, QHBoxLayout, QPushButton, QLineEdit,
-    QSizePolicy, QScrollArea, QDialog, QDialogButtonBox, QTabWidget, QStyle,
-    QSystemTrayIcon, QMenu, QStackedLayout, QSizeGrip
+    QSizePolicy, QDialog, QDialogButtonBox, QTabWidget, QStyle,
+    QSystemTrayIcon, QMenu, QStackedLayout, QSizeGrip, QSpinBox, QFormLayout, QCheckBox, QComboBox,
+    QTableWidget, QTableWidgetItem, QHeaderView, QAbstractItemView,
+    QListView, QStyledItemDelegate, QListWidget, QListWidgetItem
 )
 from PySide6.QtNetwork import (
     QNetworkAccessManager, QNetworkRequest, QNetworkReply,
@@ -43,6 +70,22 @@ R2_DEFAULTS = {
     "key_secret": "dccdeb3f153c03c3c5b5631ad505706e98c950bd38784eea11b68a1a4e5eac21",
 }
 
+# ===================== Política de codificação de imagens =====================
+ENCODE_DEFAULTS = {
+    "max_edge":  2560,       # maior lado em px (0 = sem limite)
+    "max_kb":    1500,       # orçamento por imagem em KB (0 = sem limite)
+    "format":    "auto",     # auto | png | jpeg | webp
+    "quality":   85,         # qualidade inicial dos formatos com perda
+}
+IMAGE_FORMATS = {  # formato -> (nome Qt, MIME, extensão)
+    "png":  ("PNG",  "image/png",  ".png"),
+    "jpeg": ("JPEG", "image/jpeg", ".jpg"),
+    "webp": ("WEBP", "image/webp", ".webp"),
+}
+PHOTO_COLOR_RATIO = 0.35     # fração de cores distintas na amostra 64x64 a partir da qual é "foto"
+FILE_CHUNK = 1024 * 1024     # leitura em blocos dos arquivos arrastados
+PREVIEW_SIZE = QSize(120, 100)  # decodificação reduzida da miniatura (2x o exibido, p/ telas HiDPI)
+
 # ===================== LOGGING =====================
 log_formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
 log_file = 'app_orcamento.log'
@@ -53,21 +96,216 @@ logger = logging.getLogger('app_orcamento'); logger.setLevel(logging.INFO)
 if not any(isinstance(h, logging.handlers.RotatingFileHandler) for h in logger.handlers):
     logger.addHandler(log_handler)
 
+# ===================== Métricas do pipeline =====================
+STAGE_LABELS = {
+    "encode":  "Codificação",
+    "sign":    "Assinatura",
+    "put":     "Upload (PUT)",
+    "put_part": "Upload (parte)",
+    "put_hedge": "Upload (cópia de hedge)",
+    "put_throttled": "Upload (com limite de banda)",
+    "webhook": "Webhook",
+    "delete":  "Limpeza (DELETE)",
+    "put_failed": "Upload com falha/abortado",
+    "put_part_failed": "Parte com falha/abortada",
+    "delete_failed": "Limpeza com falha",
+}
+
+class PipelineMetrics:
+    """Janela deslizante de tempos (ms) e bytes por etapa, com p50/p95.
+
+    Cada amostra também vira um registro estruturado no log
+    (`[métrica] {"stage": ..., "ms": ..., "bytes": ...}`). Pode ser alimentada
+    de threads de trabalho (codificação), por isso o lock.
+    """
+    WINDOW = 200
+
+    def __init__(self):
+        self._samples: dict = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage: str, ms: float, nbytes: int = 0, **extra):
+        with self._lock:
+            self._samples.setdefault(stage, deque(maxlen=self.WINDOW)).append((ms, nbytes))
+        rec = {"stage": stage, "ms": round(ms, 2), "bytes": nbytes}; rec.update(extra)
+        logger.info(f"[métrica] {json.dumps(rec, ensure_ascii=False)}")
+
+    @staticmethod
+    def _pct(sorted_vals: list, q: float) -> float:
+        if not sorted_vals: return 0.0
+        return sorted_vals[min(len(sorted_vals) - 1, int(round(q * (len(sorted_vals) - 1))))]
+
+    def count(self, stage: str) -> int:
+        with self._lock:
+            return len(self._samples.get(stage, ()))
+
+    def percentile(self, stage: str, q: float) -> Optional[float]:
+        with self._lock:
+            vals = sorted(ms for ms, _ in self._samples.get(stage, ()))
+        return self._pct(vals, q) if vals else None
+
+    def summary(self) -> dict:
+        """{etapa: {"n", "p50", "p95", "bytes_avg", "kbps_p50"}}"""
+        out = {}
+        with self._lock:
+            snapshot = {k: list(v) for k, v in self._samples.items()}
+        for stage, samples in snapshot.items():
+            ms = sorted(m for m, _ in samples)
+            total_bytes = sum(b for _, b in samples)
+            rates = sorted(b / m for m, b in samples if m > 0 and b)   # bytes/ms == KB/s (aprox.)
+            out[stage] = {"n": len(samples), "p50": self._pct(ms, 0.5), "p95": self._pct(ms, 0.95),
+                          "bytes_avg": total_bytes / len(samples) if samples else 0,
+                          "kbps_p50": self._pct(rates, 0.5) * 1000 / 1024 if rates else 0}
+        return out
+
+metrics = PipelineMetrics()
+
 # ===================== Utilitários =====================
-def qimage_to_png_bytes(img) -> bytes:
-    """Serializa QImage/QPixmap para PNG (deep copy p/ evitar reuso de buffer do clipboard)."""
-    if isinstance(img, QPixmap):
-        qimg = img.toImage()
-    else:
-        qimg = img
-    # deep copy para não referenciar memória volátil do clipboard/QMimeData
-    qimg = qimg.copy()
+def qimage_to_bytes(qimg: QImage, fmt: str = "PNG", quality: int = -1) -> QByteArray:
     ba = QByteArray(); buf = QBuffer(ba); buf.open(QIODevice.WriteOnly)
-    qimg.save(buf, "PNG", 92); buf.close()
-    return bytes(ba)
-
-def sha256_hex(data: bytes) -> str:
-    return hashlib.sha256(data).hexdigest()
+    ok = qimg.save(buf, fmt, quality); buf.close()
+    if not ok: raise ValueError(f"Qt não conseguiu codificar {fmt}")
+    return ba   # o próprio buffer do encoder (sem cópia para bytes)
+
+def writer_supports(fmt: str) -> bool:
+    return fmt.lower().encode() in {bytes(f).lower() for f in QImageWriter.supportedImageFormats()}
+
+def image_content_profile(qimg: QImage) -> (bool, bool):
+    """(parece_foto, tem_transparência) a partir de uma amostra 64x64.
+
+    Prints de tela e textos têm fundos chapados e poucas cores distintas;
+    fotos passam facilmente de um terço da amostra com tons diferentes.
+    """
+    small = qimg.scaled(64, 64, Qt.IgnoreAspectRatio, Qt.FastTransformation).convertToFormat(QImage.Format_ARGB32)
+    px = memoryview(small.constBits()).cast("I")
+    transparent = qimg.hasAlphaChannel() and any((p >> 24) != 0xFF for p in px)
+    distinct = len({p & 0xFFFFFF for p in px})
+    return distinct >= PHOTO_COLOR_RATIO * len(px), transparent
+
+def flatten_alpha(qimg: QImage) -> QImage:
+    """Compõe sobre fundo branco (JPEG não tem canal alfa)."""
+    out = QImage(qimg.size(), QImage.Format_RGB32); out.fill(QColor("white"))
+    p = QPainter(out); p.drawImage(0, 0, qimg); p.end()
+    return out
+
+def encode_image(qimg: QImage, policy: dict) -> (QByteArray, str):
+    """Aplica a política (lado máximo, formato, orçamento) e retorna (bytes, formato).
+
+    Acima do orçamento: reduz a qualidade dos formatos com perda até 60, troca
+    PNG pelo formato com perda quando não há transparência (modos automáticos) e, por fim, reduz a
+    resolução em 25% por passo.
+    """
+    max_edge = int(policy.get("max_edge") or 0)
+    budget = int(policy.get("max_kb") or 0) * 1024
+    quality = int(policy.get("quality") or ENCODE_DEFAULTS["quality"])
+    img = qimg
+    if max_edge and max(img.width(), img.height()) > max_edge:
+        img = img.scaled(max_edge, max_edge, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+
+    photo, transparent = image_content_profile(img)
+    mode = policy.get("format") or "auto"
+    lossy = "webp" if mode == "webp" and writer_supports("webp") else "jpeg"
+    adaptive = mode in ("auto", "webp")   # "webp" = automático usando WebP para fotos
+    fmt = (lossy if photo and not transparent else "png") if adaptive else mode
+
+    def save(image, fmt_):
+        if fmt_ == "jpeg" and image.hasAlphaChannel(): image = flatten_alpha(image)
+        return qimage_to_bytes(image, IMAGE_FORMATS[fmt_][0], -1 if fmt_ == "png" else quality)
+
+    data = save(img, fmt)
+    for _ in range(8):
+        if not budget or len(data) <= budget: break
+        if fmt != "png" and quality > 60:
+            quality -= 10
+        elif fmt == "png" and adaptive and not transparent:
+            fmt = lossy
+        elif min(img.width(), img.height()) > 64:
+            img = img.scaled(int(img.width() * 0.75), int(img.height() * 0.75), Qt.KeepAspectRatio, Qt.SmoothTransformation)
+        else:
+            break
+        data = save(img, fmt)
+    return data, fmt
+
+def passthrough_format(path: str, policy: dict) -> Optional[str]:
+    """Formato do arquivo se ele já cumpre a política e pode subir como está.
+
+    Só lê o cabeçalho (QImageReader), sem decodificar: formato aceito, maior
+    lado dentro de `max_edge` e tamanho em disco dentro do orçamento.
+    """
+    reader = QImageReader(path)
+    fmt = {"png": "png", "jpeg": "jpeg", "jpg": "jpeg", "webp": "webp"}.get(bytes(reader.format()).decode().lower())
+    size = reader.size()
+    if fmt is None or not size.isValid(): return None
+    mode = policy.get("format") or "auto"
+    if mode not in ("auto", "webp") and fmt != mode: return None
+    max_edge = int(policy.get("max_edge") or 0)
+    budget = int(policy.get("max_kb") or 0) * 1024
+    if max_edge and max(size.width(), size.height()) > max_edge: return None
+    if budget and os.path.getsize(path) > budget: return None
+    return fmt
+
+def read_file_hashed(path: str, copy_to: Optional[str] = None) -> (Optional[QByteArray], str, int):
+    """Lê o arquivo em blocos (um único buffer reaproveitado) calculando o SHA-256 no caminho.
+
+    Com `copy_to` os blocos vão direto para a cópia e nada fica em memória
+    (retorna data=None); sem ele, acumula num QByteArray.
+    """
+    h = hashlib.sha256(); size = 0
+    buf = bytearray(FILE_CHUNK); view = memoryview(buf)
+    data = None if copy_to else QByteArray()
+    out = open(copy_to, "wb") if copy_to else None
+    try:
+        with open(path, "rb") as f:
+            while True:
+                n = f.readinto(buf)
+                if not n: break
+                h.update(view[:n]); size += n
+                if out: out.write(view[:n])
+                else: data.append(bytes(view[:n]))
+    finally:
+        if out: out.close()
+    return data, h.hexdigest(), size
+
+def make_thumbnail(qimg: QImage) -> QImage:
+    if qimg.width() <= PREVIEW_SIZE.width() and qimg.height() <= PREVIEW_SIZE.height(): return qimg.copy()
+    return qimg.scaled(PREVIEW_SIZE, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+
+def is_image_file(path: str) -> bool:
+    """Checagem barata (só o cabeçalho): o Qt reconhece o formato e sabe o tamanho.
+    PDF fica de fora mesmo com o plugin do QtPdf instalado: é documento, não imagem."""
+    reader = QImageReader(path)
+    return reader.canRead() and bytes(reader.format()) != b"pdf" and reader.size().isValid()
+
+def item_bytes(item: dict, start: int = 0, length: Optional[int] = None) -> QByteArray:
+    """Bytes (ou um trecho) de um item da fila como QByteArray: da memória ou, normalmente, do spool."""
+    if item.get("data") is not None:
+        if start == 0 and length is None: return item["data"]      # compartilhado, sem cópia
+        return item["data"].mid(start, -1 if length is None else length)
+    f = QFile(item["path"])
+    if not f.open(QIODevice.ReadOnly): raise OSError(f.errorString())
+    try:
+        f.seek(start); return f.readAll() if length is None else f.read(length)
+    finally:
+        f.close()
+
+def open_item_device(item: dict) -> QIODevice:
+    """Dispositivo de leitura do item para o QNetworkAccessManager: o arquivo do spool
+    (lido sob demanda pelo Qt) ou um QBuffer sobre o QByteArray em memória."""
+    dev = QFile(item["path"]) if item.get("data") is None else QBuffer()
+    if isinstance(dev, QBuffer): dev.setData(item["data"])
+    if not dev.open(QIODevice.ReadOnly): raise OSError(dev.errorString())
+    return dev
+
+def load_preview(path: str) -> QImage:
+    """Miniatura decodificada já reduzida (o JPEG escala na própria decodificação)."""
+    reader = QImageReader(path); reader.setAutoTransform(True)
+    size = reader.size()
+    if size.isValid(): reader.setScaledSize(size.scaled(PREVIEW_SIZE, Qt.KeepAspectRatio))
+    return reader.read()
+
+def sha256_hex(data) -> str:
+    """SHA-256 de bytes ou QByteArray (via memoryview, sem copiar o buffer)."""
+    return hashlib.sha256(memoryview(data)).hexdigest()
 
 def aws_v4_sign(key: str, date_stamp: str, region: str, service: str) -> bytes:
     k_date = hmac.new(("AWS4" + key).encode(), date_stamp.encode(), hashlib.sha256).digest()
@@ -78,19 +316,1118 @@ def aws_v4_sign(key: str, date_stamp: str, region: str, service: str) -> bytes:
 def iso8601_basic(dt: datetime.datetime) -> (str, str):
     return dt.strftime('%Y%m%dT%H%M%SZ'), dt.strftime('%Y%m%d')
 
-# ===================== UI: Preview de imagem =====================
-class ImagePreviewItem(QWidget):
-    removed = Signal(QWidget)
-    def __init__(self, pixmap: QPixmap, filename: str, token: str):
+# ===================== Assinatura AWS SigV4 =====================
+UNSIGNED_PAYLOAD = "UNSIGNED-PAYLOAD"
+EMPTY_SHA256 = sha256_hex(b"")
+
+class SigV4Signer:
+    """Assina requisições S3 (SigV4) reaproveitando a chave derivada.
+
+    A cadeia de 4 HMACs de `aws_v4_sign` só muda uma vez por dia UTC, então a
+    chave fica em cache por data (região e serviço são fixos por instância). O hash do corpo pode vir
+    pronto (calculado no enfileiramento) ou ser UNSIGNED-PAYLOAD sob TLS.
+    """
+    ALGORITHM = "AWS4-HMAC-SHA256"
+    SIGNED_HEADERS = "host;x-amz-content-sha256;x-amz-date"
+    MAX_CACHED_KEYS = 8
+
+    def __init__(self, key_id: str, key_secret: str, region: str = "auto", service: str = "s3"):
+        self.key_id = key_id
+        self.key_secret = key_secret
+        self.region = region
+        self.service = service
+        self._keys = {}
+
+    def signing_key(self, date_stamp: str) -> bytes:
+        key = self._keys.get(date_stamp)
+        if key is None:
+            if len(self._keys) >= self.MAX_CACHED_KEYS: self._keys.clear()
+            key = self._keys[date_stamp] = aws_v4_sign(self.key_secret, date_stamp, self.region, self.service)
+        return key
+
+    def sign(self, method: str, host: str, canonical_uri: str, query: str = "",
+             payload_hash: str = EMPTY_SHA256, now: Optional[datetime.datetime] = None) -> dict:
+        """Retorna os headers Host/x-amz-date/x-amz-content-sha256/Authorization."""
+        amz_date, date_stamp = iso8601_basic(now or datetime.datetime.utcnow())
+        canonical_headers = f"host:{host}\n" f"x-amz-content-sha256:{payload_hash}\n" f"x-amz-date:{amz_date}\n"
+        canonical_request = "\n".join([method, canonical_uri, query, canonical_headers, self.SIGNED_HEADERS, payload_hash])
+        credential_scope = f"{date_stamp}/{self.region}/{self.service}/aws4_request"
+        string_to_sign = "\n".join([self.ALGORITHM, amz_date, credential_scope, hashlib.sha256(canonical_request.encode()).hexdigest()])
+        signature = hmac.new(self.signing_key(date_stamp), string_to_sign.encode(), hashlib.sha256).hexdigest()
+        return {
+            "Host": host,
+            "x-amz-date": amz_date,
+            "x-amz-content-sha256": payload_hash,
+            "Authorization": f"{self.ALGORITHM} Credential={self.key_id}/{credential_scope}, SignedHeaders={self.SIGNED_HEADERS}, Signature={signature}",
+        }
+
+def xml_local_name(tag: str) -> str:
+    return tag.rsplit("}", 1)[-1]
+
+def s3_canonical_query(params: dict) -> str:
+    """Query string canônica do SigV4 (chaves ordenadas, valores URI-encoded)."""
+    enc = lambda v: quote(str(v), safe="-_.~")
+    return "&".join(f"{enc(k)}={enc(v)}" for k, v in sorted(params.items()))
+
+def s3_xml_field(xml_bytes: bytes, name: str) -> str:
+    """Primeiro elemento `name` (ignorando namespace) de uma resposta XML do S3."""
+    for el in ET.fromstring(xml_bytes).iter():
+        if xml_local_name(el.tag) == name: return el.text or ""
+    return ""
+
+def s3_complete_multipart_body(etags: dict) -> bytes:
+    parts = "".join(f"<Part><PartNumber>{n}</PartNumber><ETag>{xml_escape(etags[n])}</ETag></Part>" for n in sorted(etags))
+    return f'<?xml version="1.0" encoding="UTF-8"?><CompleteMultipartUpload>{parts}</CompleteMultipartUpload>'.encode("utf-8")
+
+def s3_delete_objects_body(keys: List[str]) -> bytes:
+    """Corpo XML do S3 DeleteObjects em modo silencioso (só retorna erros)."""
+    objs = "".join(f"<Object><Key>{xml_escape(k)}</Key></Object>" for k in keys)
+    return f'<?xml version="1.0" encoding="UTF-8"?><Delete><Quiet>true</Quiet>{objs}</Delete>'.encode("utf-8")
+
+def s3_delete_objects_errors(xml_bytes: bytes) -> dict:
+    """Extrai {key: "Code: Message"} dos elementos <Error> da resposta do DeleteObjects."""
+    errors = {}
+    if not xml_bytes: return errors
+    root = ET.fromstring(xml_bytes)
+    for el in root.iter():
+        if xml_local_name(el.tag) != "Error": continue
+        fields = {xml_local_name(c.tag): (c.text or "") for c in el}
+        if fields.get("Key"):
+            errors[fields["Key"]] = f"{fields.get('Code', '')}: {fields.get('Message', '')}".strip(": ")
+    return errors
+
+# ===================== Novas tentativas (PUT/DELETE) =====================
+RETRYABLE_NETWORK_ERRORS = {
+    QNetworkReply.TimeoutError, QNetworkReply.RemoteHostClosedError, QNetworkReply.ConnectionRefusedError,
+    QNetworkReply.HostNotFoundError, QNetworkReply.TemporaryNetworkFailureError, QNetworkReply.NetworkSessionFailedError,
+    QNetworkReply.UnknownNetworkError, QNetworkReply.ProxyConnectionClosedError, QNetworkReply.ProxyTimeoutError,
+}
+RETRYABLE_S3_CODES = {"InternalError", "ServiceUnavailable", "SlowDown", "RequestTimeout"}
+
+def is_retryable(error, http_status: Optional[int]) -> bool:
+    """Falha transitória? Timeout, conexão caída/recusada, DNS, 5xx, 408 e 429 sim;
+    demais 4xx e cancelamentos (abort) são definitivos."""
+    if http_status: return http_status >= 500 or http_status in (408, 429)
+    return error in RETRYABLE_NETWORK_ERRORS
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """Backoff exponencial com jitter total: uniforme em [0, min(cap, base * 2^tentativa)]."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+# ===================== Upload concorrente =====================
+class UploadPool:
+    """Executa uploads com no máximo `limit` requisições em voo.
+
+    `start(item, on_done)` dispara o upload de um item e deve chamar
+    `on_done(ok, key_path, url, err)` ao terminar. Os resultados ficam na
+    posição original do item, então a ordem da fila é preservada mesmo que
+    as respostas cheguem fora de ordem.
+    """
+    def __init__(self, items, start, limit: int = 4, on_item=None, on_all_done=None):
+        self.items = list(items)
+        self.start = start
+        self.limit = max(1, int(limit))
+        self.on_item = on_item            # (idx, ok, key_path, url, err)
+        self.on_all_done = on_all_done    # (results)
+        self.results: List[Optional[tuple]] = [None] * len(self.items)
+        self._next = 0; self._in_flight = 0; self._settled = 0
+
+    def run(self):
+        if not self.items:
+            if self.on_all_done: self.on_all_done(self.results)
+            return
+        self._fill()
+
+    def _fill(self):
+        while self._in_flight < self.limit and self._next < len(self.items):
+            idx = self._next; self._next += 1; self._in_flight += 1
+            try:
+                self.start(self.items[idx], lambda ok, key_path, url, err, i=idx: self._settle(i, ok, key_path, url, err))
+            except Exception as e:
+                self._settle(idx, False, "", "", str(e))
+
+    def _settle(self, idx: int, ok: bool, key_path: str, url: str, err: str):
+        if self.results[idx] is not None: return  # slot já resolvido
+        self.results[idx] = (ok, key_path, url, err)
+        self._in_flight -= 1; self._settled += 1
+        if self.on_item: self.on_item(idx, ok, key_path, url, err)
+        if self._settled >= len(self.items):
+            if self.on_all_done: self.on_all_done(self.results)
+            return
+        self._fill()
+
+class UploadBudget:
+    """Limite global de uploads em voo, compartilhado por todos os envios.
+
+    `run(start, item, on_done)` tem a assinatura do `start` do UploadPool e
+    espera um slot livre; os pedidos saem em FIFO, então o orçamento N ocupa
+    a banda antes do N+1, que só se sobrepõe ao webhook e à limpeza do N.
+    """
+    def __init__(self, limit: int = 4):
+        self.limit = max(1, int(limit))
+        self.in_use = 0
+        self._waiting: deque = deque()
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiting)
+
+    def set_limit(self, limit: int):
+        """Novo limite; se subiu, os pedidos em espera saem já (se desceu, os em voo só terminam)."""
+        self.limit = max(1, int(limit)); self._pump()
+
+    def run(self, start, item, on_done):
+        self._waiting.append((start, item, on_done)); self._pump()
+
+    def _pump(self):
+        while self.in_use < self.limit and self._waiting:
+            start, item, on_done = self._waiting.popleft()
+            self.in_use += 1
+            settled = []
+            def release(ok, key_path, url, err, on_done=on_done, settled=settled):
+                if settled: return
+                settled.append(True); self.in_use -= 1
+                on_done(ok, key_path, url, err); self._pump()
+            try:
+                start(item, release)
+            except Exception as e:
+                release(False, "", "", str(e))
+
+# ===================== Limite de banda (uploads) =====================
+class BandwidthLimiter(QObject):
+    """Balde de fichas global para os corpos enviados: todos os uploads dividem a mesma taxa.
+
+    `rate` em bytes/s (0 = sem limite); o balde acumula no máximo BURST_S de
+    taxa. No modo automático, `rtt_sample()` faz AIMD: RTT bem acima da base
+    (fila no uplink, a chamada do vendedor engasga) corta a taxa; RTT normal
+    com uploads esperando fichas a recupera aos poucos, até o teto.
+    """
+    refilled = Signal()
+    TICK_MS = 20
+    BURST_S = 0.1
+    MIN_RATE = 32 * 1024
+    AUTO_START = 1024 * 1024       # taxa inicial do automático sem teto nem medições
+    RTT_MARGIN_MS = 60             # folga sobre o RTT base antes de cortar
+    RTT_BASE_WINDOW = 120          # amostras usadas no mínimo (RTT base)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.ceiling = 0; self.auto = False; self.rate = 0.0
+        self._tokens = 0.0; self._stamp = time.monotonic()
+        self._starved = False
+        self._rtts = deque(maxlen=self.RTT_BASE_WINDOW)
+        self._timer = QTimer(self); self._timer.setInterval(self.TICK_MS); self._timer.timeout.connect(self._tick)
+
+    def configure(self, ceiling: int, auto: bool, start_rate: float = 0.0):
+        self.ceiling, self.auto = max(0, ceiling), auto
+        if auto: self.rate = float(min(ceiling or float("inf"), start_rate or self.AUTO_START))
+        else: self.rate = float(ceiling)
+        self._rtts.clear()
+
+    @property
+    def active(self) -> bool:
+        return self.rate > 0
+
+    def take(self, n: int) -> int:
+        """Libera até `n` bytes agora (pode ser 0; `refilled` avisa quando houver fichas)."""
+        if not self.active: return n
+        now = time.monotonic()
+        self._tokens = min(self.rate * self.BURST_S, self._tokens + (now - self._stamp) * self.rate); self._stamp = now
+        grant = int(min(n, self._tokens))
+        self._tokens -= grant
+        if grant < n:
+            self._starved = True
+            if not self._timer.isActive(): self._timer.start()
+        return grant
+
+    def _tick(self):
+        if not self._starved: self._timer.stop(); return
+        self._starved = False
+        self.refilled.emit()
+
+    def rtt_sample(self, ms: float):
+        if not (self.auto and self.active): return
+        self._rtts.append(ms)
+        base = min(self._rtts)
+        if ms > base + max(self.RTT_MARGIN_MS, base * 0.5):
+            self.rate = max(self.MIN_RATE, self.rate * 0.7)
+            logger.info(f"[banda] RTT {ms:.0f}ms (base {base:.0f}ms): upload reduzido para {self.rate / 1024:.0f} KB/s")
+        elif self._starved:
+            self.rate = min(self.ceiling or float("inf"), self.rate * 1.1 + 16 * 1024)
+
+class ThrottledDevice(QIODevice):
+    """Corpo de upload lido da fonte só no ritmo liberado pelo BandwidthLimiter.
+
+    Sequencial e de tamanho conhecido: com Content-Length e
+    DoNotBufferUploadDataAttribute o QNAM lê sob demanda em vez de copiar tudo
+    antes de enviar; sem fichas, `readData` devolve 0 bytes e `readyRead` volta
+    a chamar quando o balde enche.
+    """
+    def __init__(self, source: QIODevice, size: int, limiter: BandwidthLimiter, parent=None):
+        super().__init__(parent)
+        self.source, self.total, self.limiter = source, size, limiter
+        source.setParent(self)
+        self._sent = 0
+        limiter.refilled.connect(self._wake)
+        self.open(QIODevice.ReadOnly | QIODevice.Unbuffered)
+
+    def isSequential(self) -> bool:
+        return True
+
+    def atEnd(self) -> bool:
+        return self._sent >= self.total
+
+    def bytesAvailable(self) -> int:
+        return self.total - self._sent
+
+    def readData(self, maxlen: int):
+        n = self.limiter.take(min(maxlen, self.total - self._sent))
+        if n <= 0: return b""
+        data = self.source.read(n)
+        self._sent += len(data)
+        return bytes(data)
+
+    def writeData(self, data) -> int:
+        return -1
+
+    @Slot()
+    def _wake(self):
+        if not self.atEnd(): self.readyRead.emit()
+
+# ===================== Codificação em segundo plano =====================
+class EncodeSignals(QObject):
+    preview = Signal(str, object)      # token, miniatura (sai antes da codificação)
+    done = Signal(str, object)         # token, {"data" (None se foi p/ o spool), "size", "sha256", "format", "path", "thumb"}
+    failed = Signal(str, str)          # token, erro
+
+class EncodeTask(QRunnable):
+    """Codifica um QImage (já desacoplado do clipboard) segundo a política, calcula o SHA-256
+    e grava a cópia no spool do diário, tudo fora da thread da GUI."""
+    def __init__(self, token: str, qimg: QImage, policy: dict, spool_dir: Optional[Path] = None,
+                 thumbs: Optional["ThumbnailCache"] = None):
+        super().__init__()
+        self.setAutoDelete(False)
+        self.token = token
+        self.qimg = qimg
+        self.policy = dict(policy)
+        self.spool_dir = spool_dir
+        self.thumbs = thumbs
+        self.thumb: Optional[QImage] = None
+        self.signals = EncodeSignals()
+
+    def _emit_preview(self, cached: Optional[QImage] = None):
+        # A linha ganha miniatura já; codificação e hash vêm depois
+        self.thumb = cached if cached is not None else self._thumbnail()
+        self.signals.preview.emit(self.token, self.thumb)
+
+    def run(self):
+        try:
+            t0 = time.monotonic()
+            self._emit_preview()
+            data, fmt = encode_image(self.qimg, self.policy)
+            self._done(t0, data, sha256_hex(data), fmt)
+        except Exception as e:
+            self.signals.failed.emit(self.token, str(e))
+        finally:
+            self.qimg = None
+
+    def _spool_path(self, fmt: str) -> str:
+        return str(self.spool_dir / f"{self.token}{IMAGE_FORMATS[fmt][2]}") if self.spool_dir is not None else ""
+
+    def _done(self, t0: float, data: Optional[QByteArray], sha256: str, fmt: str, size: Optional[int] = None,
+              spooled: bool = False, **extra):
+        size = len(data) if size is None else size
+        metrics.record("encode", (time.monotonic() - t0) * 1000, size, format=fmt, **extra)
+        path = self._spool_path(fmt)
+        if path and not spooled:
+            with open(path, "wb") as f: f.write(memoryview(data))
+        thumb = self.thumb if self.thumb is not None else self._thumbnail()
+        if self.thumbs and not self.thumbs.has(sha256): self.thumbs.put(sha256, thumb)
+        # Com spool, só o caminho atravessa o sinal: o buffer morre aqui (1 cópia por imagem)
+        self.signals.done.emit(self.token, {"data": None if path else data, "size": size, "sha256": sha256,
+                                            "format": fmt, "path": path, "thumb": thumb})
+
+    def _thumbnail(self) -> QImage:
+        return make_thumbnail(self.qimg)
+
+class FileImportTask(EncodeTask):
+    """Arquivo arrastado: se já cumpre a política, sobe com os bytes originais
+    (lidos em blocos, hash e cópia ao spool no mesmo passo); senão decodifica
+    aqui mesmo, fora da GUI, e segue o caminho normal de codificação."""
+    def __init__(self, token: str, path: str, policy: dict, spool_dir: Optional[Path] = None,
+                 thumbs: Optional["ThumbnailCache"] = None):
+        super().__init__(token, None, policy, spool_dir, thumbs)
+        self.path = path
+
+    def run(self):
+        try:
+            t0 = time.monotonic()
+            fmt = passthrough_format(self.path, self.policy)
+            if fmt:
+                # Digest dos bytes que sobem sai antes de decodificar: arquivo já visto usa a miniatura do cache
+                data, sha256, size = read_file_hashed(self.path, self._spool_path(fmt) or None)
+                self._emit_preview(self.thumbs.get(sha256) if self.thumbs else None)
+                self._done(t0, data, sha256, fmt, size, spooled=True, passthrough=True); return
+            self._emit_preview()               # decodificação reduzida, antes da decodificação inteira
+            reader = QImageReader(self.path); reader.setAutoTransform(True)
+            self.qimg = reader.read()
+            if self.qimg.isNull(): raise ValueError(reader.errorString())
+            data, fmt = encode_image(self.qimg, self.policy)
+            self._done(t0, data, sha256_hex(data), fmt)
+        except Exception as e:
+            self.signals.failed.emit(self.token, str(e))
+        finally:
+            self.qimg = None
+
+    def _thumbnail(self) -> QImage:
+        return make_thumbnail(self.qimg) if self.qimg is not None else load_preview(self.path)
+
+class ThumbnailTask(QRunnable):
+    """Miniatura de um arquivo do spool (fila restaurada sem miniatura em cache)."""
+    def __init__(self, token: str, path: str, sha256: str, thumbs: "ThumbnailCache"):
         super().__init__()
-        lay = QHBoxLayout(self); lay.setContentsMargins(5,5,5,5); lay.setSpacing(6)
-        thumb = QLabel(); thumb.setPixmap(pixmap.scaled(60,50,Qt.KeepAspectRatio,Qt.SmoothTransformation))
-        name = QLabel(filename); name.setWordWrap(True); name.setSizePolicy(QSizePolicy.Ignored, QSizePolicy.Preferred)
-        rm = QPushButton("X"); rm.setFixedSize(22,22)
-        rm.setStyleSheet("QPushButton{border-radius:11px;background:rgba(255,255,255,0.08);} QPushButton:hover{background:rgba(255,80,80,0.9);}")
-        rm.clicked.connect(lambda: self.removed.emit(self))
-        lay.addWidget(thumb); lay.addWidget(name, 1); lay.addWidget(rm)
-        self._token = token
+        self.setAutoDelete(False)
+        self.token, self.path, self.sha256, self.thumbs = token, path, sha256, thumbs
+        self.signals = EncodeSignals()
+
+    def run(self):
+        thumb = load_preview(self.path)
+        if thumb.isNull():
+            self.signals.failed.emit(self.token, "miniatura indisponível"); return
+        self.thumbs.put(self.sha256, thumb)
+        self.signals.done.emit(self.token, {"thumb": thumb})
+
+# ===================== Cache de miniaturas =====================
+class ThumbnailCache:
+    """Miniaturas PNG em disco indexadas pelo SHA-256 da imagem enviada.
+
+    Despejo LRU por tamanho total: o mtime do arquivo marca o último uso
+    (atualizado a cada leitura). Usada pelos workers e pela GUI.
+    """
+    MAX_BYTES = 20 * 1024 * 1024
+
+    def __init__(self, root: Path, max_bytes: int = MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        try:
+            root.mkdir(parents=True, exist_ok=True); self.root = root
+        except OSError as e:
+            logger.error(f"Cache de miniaturas indisponível em {root}: {e}")
+            self.root = None
+
+    def has(self, sha256: str) -> bool:
+        return bool(self.root and sha256) and (self.root / f"{sha256}.png").is_file()
+
+    def get(self, sha256: str) -> Optional[QImage]:
+        if not (self.root and sha256): return None
+        path = self.root / f"{sha256}.png"
+        img = QImage(str(path))
+        if img.isNull(): return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return img
+
+    def put(self, sha256: str, thumb: QImage):
+        if not (self.root and sha256) or thumb.isNull(): return
+        with self._lock:
+            thumb.save(str(self.root / f"{sha256}.png"), "PNG")
+            self._evict()
+
+    def _evict(self):
+        entries = []
+        for p in self.root.glob("*.png"):
+            try:
+                st = p.stat(); entries.append((st.st_mtime, st.st_size, p))
+            except OSError:
+                pass
+        total = sum(size for _, size, _ in entries)
+        for _, size, p in sorted(entries):
+            if total <= self.max_bytes: break
+            UploadJournal._unlink(str(p)); total -= size
+
+# ===================== Diário de envios (journal) =====================
+class UploadJournal:
+    """Registro em disco da fila e dos envios (SQLite + cópias das imagens em spool).
+
+    Cada orçamento é um job: `draft` (fila atual) -> `uploading` -> `webhook_sent`
+    e, ao terminar a limpeza, o job e seus arquivos somem. Se o webhook desiste,
+    o job para em `webhook_failed` até o vendedor reenviar ou descartar. Cada item guarda
+    `encoded` (bytes no spool) ou `uploaded` (key/url no R2), de modo que um
+    envio interrompido retoma do último passo concluído sem re-upload.
+
+    No modo de chaves por conteúdo, `objects` indexa (escopo, SHA-256) -> objeto
+    no R2 (refs = itens/orçamentos que ainda usam o link); o escopo é o
+    endpoint/bucket + endereço público, então trocar o bucket nas configurações
+    não devolve links do anterior. Objetos sem referência só saem do bucket
+    depois do TTL.
+    """
+    def __init__(self, root: Path):
+        try:
+            root.mkdir(parents=True, exist_ok=True)
+            self.spool_dir = root / "spool"; self.spool_dir.mkdir(exist_ok=True)
+            self.db = sqlite3.connect(str(root / "journal.sqlite3"))
+        except (OSError, sqlite3.Error) as e:
+            # Sem disco gravável: segue funcionando, só não sobrevive a um crash
+            logger.error(f"Diário indisponível em {root}: {e}")
+            self.spool_dir = None
+            self.db = sqlite3.connect(":memory:")
+        self.db.row_factory = sqlite3.Row
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS jobs(
+                id TEXT PRIMARY KEY, created REAL, state TEXT,
+                client_name TEXT, phone TEXT, conversation_id TEXT);
+            CREATE TABLE IF NOT EXISTS items(
+                token TEXT PRIMARY KEY, job_id TEXT, pos INTEGER, filename TEXT, mime TEXT,
+                sha256 TEXT, path TEXT, state TEXT, key TEXT, url TEXT);
+            CREATE TABLE IF NOT EXISTS mpu(
+                token TEXT PRIMARY KEY, key TEXT, upload_id TEXT, part_size INTEGER, created REAL);
+            CREATE TABLE IF NOT EXISTS mpu_parts(
+                upload_id TEXT, part INTEGER, etag TEXT, PRIMARY KEY(upload_id, part));
+            CREATE TABLE IF NOT EXISTS objects(
+                scope TEXT, sha256 TEXT, key TEXT, url TEXT, refs INTEGER DEFAULT 0, last_used REAL,
+                PRIMARY KEY(scope, sha256), UNIQUE(scope, key));
+            CREATE TABLE IF NOT EXISTS outbox(
+                id INTEGER PRIMARY KEY AUTOINCREMENT, job_id TEXT, url TEXT, body BLOB,
+                attempts INTEGER DEFAULT 0, next_at REAL, last_error TEXT, created REAL);
+        """)
+        self.db.commit()
+
+    @staticmethod
+    def default_root() -> Path:
+        base = QStandardPaths.writableLocation(QStandardPaths.GenericDataLocation) or str(Path.home())
+        return Path(base) / "OmniForge" / "AppOrcamento"
+
+    def new_draft(self) -> str:
+        row = self.db.execute("SELECT id FROM jobs WHERE state='draft' ORDER BY created LIMIT 1").fetchone()
+        if row: return row["id"]
+        job_id = uuid.uuid4().hex
+        self.db.execute("INSERT INTO jobs(id, created, state) VALUES(?,?,'draft')", (job_id, time.time()))
+        self.db.commit()
+        return job_id
+
+    def add_item(self, job_id: str, item: dict):
+        self.db.execute(
+            "INSERT OR REPLACE INTO items(token, job_id, pos, filename, mime, sha256, path, state) VALUES(?,?,?,?,?,?,?,'encoded')",
+            (item["token"], job_id, item.get("pos", 0), item["filename"], item.get("mime", ""), item.get("sha256", ""), item.get("path", "")))
+        self.db.commit()
+
+    def remove_item(self, token: str):
+        row = self.db.execute("SELECT path FROM items WHERE token=?", (token,)).fetchone()
+        if row is None: return
+        self._unlink(row["path"])
+        self.mpu_clear(token)
+        self.db.execute("DELETE FROM items WHERE token=?", (token,)); self.db.commit()
+
+    def reorder(self, tokens: List[str]):
+        self.db.executemany("UPDATE items SET pos=? WHERE token=?", [(i, t) for i, t in enumerate(tokens)]); self.db.commit()
+
+    def mark_uploaded(self, token: str, key: str, url: str):
+        self.db.execute("UPDATE items SET state='uploaded', key=?, url=? WHERE token=?", (key, url, token)); self.db.commit()
+
+    def start_job(self, job_id: str, client_name: str, phone: str, conversation_id: str, tokens: List[str]):
+        self.db.execute("UPDATE jobs SET state='uploading', client_name=?, phone=?, conversation_id=? WHERE id=?",
+                        (client_name, phone, conversation_id, job_id))
+        self.db.executemany("UPDATE items SET pos=? WHERE token=?", [(i, t) for i, t in enumerate(tokens)])
+        self.db.commit()
+
+    def job_keys(self, job_id: str) -> List[str]:
+        return [r["key"] for r in self.db.execute("SELECT key FROM items WHERE job_id=? AND key IS NOT NULL ORDER BY pos", (job_id,)).fetchall()]
+
+    def set_job_state(self, job_id: str, state: str):
+        self.db.execute("UPDATE jobs SET state=? WHERE id=?", (state, job_id)); self.db.commit()
+
+    def finish_job(self, job_id: str):
+        for row in self.db.execute("SELECT token, path FROM items WHERE job_id=?", (job_id,)).fetchall():
+            self._unlink(row["path"]); self.mpu_clear(row["token"])
+        self.db.execute("DELETE FROM items WHERE job_id=?", (job_id,))
+        self.db.execute("DELETE FROM outbox WHERE job_id=?", (job_id,))
+        self.db.execute("DELETE FROM jobs WHERE id=?", (job_id,)); self.db.commit()
+
+    def job(self, job_id: str) -> Optional[dict]:
+        row = self.db.execute("SELECT * FROM jobs WHERE id=?", (job_id,)).fetchone()
+        if row is None: return None
+        items = [dict(r) for r in self.db.execute("SELECT * FROM items WHERE job_id=? ORDER BY pos", (job_id,)).fetchall()]
+        return dict(row, items=items)
+
+    def jobs(self) -> List[dict]:
+        """Jobs não concluídos (inclusive o rascunho), com itens em ordem."""
+        out = []
+        for job in self.db.execute("SELECT * FROM jobs ORDER BY created").fetchall():
+            items = [dict(r) for r in self.db.execute("SELECT * FROM items WHERE job_id=? ORDER BY pos", (job["id"],)).fetchall()]
+            out.append(dict(job, items=items))
+        return out
+
+    # --- uploads multipart em andamento (retomada por parte) ---
+    def mpu_get(self, token: str) -> Optional[dict]:
+        row = self.db.execute("SELECT * FROM mpu WHERE token=?", (token,)).fetchone()
+        if row is None: return None
+        parts = {r["part"]: r["etag"] for r in self.db.execute("SELECT part, etag FROM mpu_parts WHERE upload_id=?", (row["upload_id"],))}
+        return dict(row, parts=parts)
+
+    def mpu_start(self, token: str, key: str, upload_id: str, part_size: int):
+        self.db.execute("INSERT OR REPLACE INTO mpu(token, key, upload_id, part_size, created) VALUES(?,?,?,?,?)",
+                        (token, key, upload_id, part_size, time.time()))
+        self.db.commit()
+
+    def mpu_part_done(self, upload_id: str, part: int, etag: str):
+        self.db.execute("INSERT OR REPLACE INTO mpu_parts(upload_id, part, etag) VALUES(?,?,?)", (upload_id, part, etag)); self.db.commit()
+
+    def mpu_clear(self, token: str):
+        row = self.db.execute("SELECT upload_id FROM mpu WHERE token=?", (token,)).fetchone()
+        if row: self.db.execute("DELETE FROM mpu_parts WHERE upload_id=?", (row["upload_id"],))
+        self.db.execute("DELETE FROM mpu WHERE token=?", (token,)); self.db.commit()
+
+    # --- índice de objetos por conteúdo (reaproveitados entre orçamentos) ---
+    def obj_get(self, scope: str, sha256: str) -> Optional[dict]:
+        row = self.db.execute("SELECT * FROM objects WHERE scope=? AND sha256=?", (scope, sha256)).fetchone() if sha256 else None
+        return dict(row) if row else None
+
+    def obj_put(self, scope: str, sha256: str, key: str, url: str, ref: bool = True):
+        """Registra o objeto (idempotente); `ref` soma uma referência."""
+        self.db.execute("INSERT INTO objects(scope, sha256, key, url, refs, last_used) VALUES(?,?,?,?,0,?) "
+                        "ON CONFLICT(scope, sha256) DO UPDATE SET key=excluded.key, url=excluded.url, last_used=excluded.last_used",
+                        (scope, sha256, key, url, time.time()))
+        if ref: self.db.execute("UPDATE objects SET refs=refs+1 WHERE scope=? AND sha256=?", (scope, sha256))
+        self.db.commit()
+
+    def obj_release(self, scope: str, keys: List[str], job_id: Optional[str] = None) -> List[str]:
+        """Solta uma referência de cada chave indexada e devolve as demais (objetos
+        exclusivos, que podem ser apagados já). Com `job_id`, as chaves soltas saem
+        dos itens do job na mesma transação, para uma retomada não soltar de novo."""
+        indexed = {r["key"] for r in self.db.execute(
+            f"SELECT key FROM objects WHERE scope=? AND key IN ({','.join('?' * len(keys))})", [scope] + keys)} if keys else set()
+        now = time.time()
+        for k in keys:
+            if k in indexed: self.db.execute("UPDATE objects SET refs=MAX(0, refs-1), last_used=? WHERE scope=? AND key=?", (now, scope, k))
+        if job_id and indexed:
+            self.db.executemany("UPDATE items SET key=NULL WHERE job_id=? AND key=?", [(job_id, k) for k in indexed])
+        self.db.commit()
+        return [k for k in keys if k not in indexed]
+
+    def obj_expire(self, scope: str, ttl_s: float) -> List[str]:
+        """Tira do índice os objetos do escopo sem referência e sem uso há `ttl_s`; devolve as chaves a apagar
+        (as de outros escopos esperam: o DELETE iria para o bucket errado)."""
+        rows = self.db.execute("SELECT sha256, key FROM objects WHERE scope=? AND refs<=0 AND last_used<?",
+                               (scope, time.time() - ttl_s)).fetchall()
+        self.db.executemany("DELETE FROM objects WHERE scope=? AND sha256=?", [(scope, r["sha256"]) for r in rows]); self.db.commit()
+        return [r["key"] for r in rows]
+
+    def purge_orphan_spool(self):
+        if self.spool_dir is None: return
+        known = {r["path"] for r in self.db.execute("SELECT path FROM items").fetchall()}
+        for f in self.spool_dir.iterdir():
+            if str(f) not in known: self._unlink(str(f))
+
+    def close(self):
+        try: self.db.close()
+        except sqlite3.Error: pass
+
+    @staticmethod
+    def _unlink(path: str):
+        if not path: return
+        try: os.remove(path)
+        except OSError: pass
+
+# ===================== Transporte HTTP (R2) =====================
+class R2Transport(QObject):
+    """Monta as requisições ao R2 reaproveitando conexões.
+
+    A configuração TLS é criada uma vez (com ALPN h2/http1.1 quando HTTP/2 está
+    liberado), `warmup()` abre a conexão ao endpoint antes do primeiro upload e
+    o QNetworkAccessManager multiplexa PUT/DELETE em HTTP/2 ou reaproveita o
+    keep-alive do HTTP/1.1. `track()` loga os tempos de cada requisição.
+    """
+    def __init__(self, nam: QNetworkAccessManager, endpoint: str, http2: bool = True, parent=None):
+        super().__init__(parent)
+        self.nam = nam
+        self.endpoint = QUrl(endpoint)
+        self.http2 = http2
+        self.ssl_config = QSslConfiguration.defaultConfiguration()
+        self.ssl_config.setProtocol(QSsl.TlsV1_2OrLater)
+        protocols = [QSslConfiguration.NextProtocolHttp1_1]
+        if http2: protocols.insert(0, QSslConfiguration.ALPNProtocolHTTP2)
+        self.ssl_config.setAllowedNextProtocols([QByteArray(p.encode()) for p in protocols])
+
+    def request(self, url: QUrl) -> QNetworkRequest:
+        req = QNetworkRequest(url)
+        https = url.scheme() == "https"
+        # HTTP/2 só sobre TLS (ALPN); em texto puro fica no keep-alive do HTTP/1.1
+        req.setAttribute(QNetworkRequest.Http2AllowedAttribute, self.http2 and https)
+        if https: req.setSslConfiguration(self.ssl_config)
+        return req
+
+    def warmup(self):
+        """Abre (TCP+TLS) a conexão ao endpoint; o primeiro PUT já a encontra pronta."""
+        host = self.endpoint.host()
+        if not host: return
+        if self.endpoint.scheme() == "https":
+            self.nam.connectToHostEncrypted(host, self.endpoint.port(443), self.ssl_config)
+        else:
+            self.nam.connectToHost(host, self.endpoint.port(80))
+
+    def track(self, reply: QNetworkReply, label: str, nbytes: int = 0, stage: Optional[str] = None):
+        """Loga conexão/TLS, envio, 1º byte e total da requisição (ms, relógio monotônico);
+        com `stage`, a requisição entra nas métricas do pipeline."""
+        t = {"start": time.monotonic()}
+        mark = lambda name: t.setdefault(name, time.monotonic())
+        reply.socketStartedConnecting.connect(lambda: mark("connect"))
+        reply.encrypted.connect(lambda: mark("tls"))
+        reply.requestSent.connect(lambda: mark("sent"))
+        reply.metaDataChanged.connect(lambda: mark("first_byte"))
+
+        def finished():
+            end = time.monotonic()
+            ms = lambda a, b: f"{(t[b] - t[a]) * 1000:.0f}" if a in t and b in t else "-"
+            t["end"] = end
+            # Sem socketStartedConnecting a requisição reaproveitou uma conexão aberta
+            # (o Qt não separa o connect TCP do handshake TLS: os dois vêm somados)
+            if "connect" not in t: conn = "reaproveitada"
+            elif "tls" in t: conn = f"nova (TCP+TLS {ms('connect', 'tls')}ms)"
+            else: conn = f"nova (TCP {ms('connect', 'sent')}ms)"
+            http2 = bool(reply.attribute(QNetworkRequest.Http2WasUsedAttribute))
+            logger.info(f"[rede] {label} HTTP {reply.attribute(QNetworkRequest.HttpStatusCodeAttribute)} "
+                        f"conexão={conn} envio={ms('start', 'sent')}ms 1º byte={ms('sent', 'first_byte')}ms "
+                        f"total={ms('start', 'end')}ms h2={http2} bytes={nbytes}")
+            if stage:
+                # Falhas e abortos (perdedor do hedge) ficam numa etapa à parte: não distorcem o p95
+                ok = reply.error() == QNetworkReply.NoError
+                metrics.record(stage if ok else f"{stage}_failed", (end - t["start"]) * 1000, nbytes, ok=ok,
+                               reused="connect" not in t, h2=http2)
+        reply.finished.connect(finished)
+        return reply
+
+# ===================== Upload multipart (S3) =====================
+class MultipartUpload:
+    """Create -> UploadPart (paralelo) -> Complete, com Abort no cancelamento.
+
+    Cada parte tem novas tentativas próprias e, ao terminar, tem o ETag gravado
+    no diário; se o envio cair, a próxima tentativa do mesmo item reaproveita
+    o UploadId e sobe só as partes que faltam. `owner` é a FloatingWidget
+    (assinatura, transporte e diário).
+    """
+    PART_ATTEMPTS = 3
+
+    def __init__(self, owner, item: dict, key_path: str, on_done, part_size: int, parallel: int = 3):
+        self.owner = owner
+        self.item = item
+        self.key_path = key_path
+        self.on_done = on_done
+        self.part_size = part_size
+        self.parallel = max(1, parallel)
+        self.upload_id = ""
+        self.etags: dict = {}
+        self._replies: set = set()
+        self._finished = False
+        self._restarted = False
+
+    @property
+    def part_count(self) -> int:
+        return max(1, -(-self.item["size"] // self.part_size))
+
+    def start(self):
+        rec = self.owner.journal.mpu_get(self.item["token"])
+        if rec and rec["part_size"] == self.part_size:
+            self.key_path, self.upload_id, self.etags = rec["key"], rec["upload_id"], dict(rec["parts"])
+            logger.info(f"Multipart retomado ({self.key_path}): {len(self.etags)}/{self.part_count} parte(s) já no R2")
+            self._upload_parts()
+        else:
+            self._create()
+        return self
+
+    def abort(self):
+        if self._finished: return
+        self._finished = True              # antes do abort(): os callbacks das partes não reagendam
+        for reply in list(self._replies): reply.abort()
+        if self.upload_id:
+            self._send("DELETE", {"uploadId": self.upload_id}, b"", "Abort multipart", lambda reply: None)
+        self.owner.journal.mpu_clear(self.item["token"])
+        self.on_done(False, self.key_path, "", "Operation canceled")
+
+    # --- etapas ---
+    def _create(self):
+        def created(reply):
+            if reply.error() != QNetworkReply.NoError:
+                self._finish(False, "", reply.errorString()); return
+            try:
+                self.upload_id = s3_xml_field(bytes(reply.readAll()), "UploadId")
+            except ET.ParseError:
+                self.upload_id = ""
+            if not self.upload_id:
+                self._finish(False, "", "CreateMultipartUpload sem UploadId"); return
+            self.etags = {}
+            self.owner.journal.mpu_start(self.item["token"], self.key_path, self.upload_id, self.part_size)
+            self._upload_parts()
+        self._send("POST", {"uploads": ""}, b"", "Create multipart", created, content_type=self.item.get("mime") or "image/png")
+
+    def _upload_parts(self):
+        missing = [n for n in range(1, self.part_count + 1) if n not in self.etags]
+        pool = UploadPool(missing, self._put_part, self.parallel, on_all_done=self._parts_settled)
+        pool.run()
+
+    def _put_part(self, n: int, on_done, attempt: int = 1):
+        if self._finished: on_done(False, n, "", "cancelado"); return
+        start = (n - 1) * self.part_size
+        body = item_bytes(self.item, start, self.part_size)
+
+        def sent(reply):
+            if reply.error() == QNetworkReply.NoError:
+                etag = bytes(reply.rawHeader("ETag")).decode().strip()
+                self.etags[n] = etag
+                self.owner.journal.mpu_part_done(self.upload_id, n, etag)
+                on_done(True, n, etag, ""); return
+            err = reply.errorString()
+            st = reply.attribute(QNetworkRequest.HttpStatusCodeAttribute)
+            if self._finished or not is_retryable(reply.error(), st) or attempt >= self.PART_ATTEMPTS:
+                on_done(False, n, "", f"{err} (HTTP {st})"); return   # 404 = UploadId sumiu (ver _parts_settled)
+            delay = backoff_delay(attempt, ResilientPut.BACKOFF_BASE, ResilientPut.BACKOFF_CAP)
+            logger.warning(f"Parte {n} de {self.key_path} falhou ({err}); tentativa {attempt + 1}/{self.PART_ATTEMPTS} em {delay:.1f}s")
+            QTimer.singleShot(int(delay * 1000), lambda: self._put_part(n, on_done, attempt + 1))
+
+        self._send("PUT", {"partNumber": n, "uploadId": self.upload_id}, body, f"UploadPart {n}/{self.part_count}", sent,
+                   stage="put_part")
+
+    def _parts_settled(self, results):
+        if self._finished: return
+        failed = [r for r in results if not (r and r[0])]
+        if not failed:
+            self._complete(); return
+        if any("HTTP 404" in r[3] for r in failed if r) and not self._restarted:
+            # UploadId expirou/foi abortado no R2: recomeça do zero uma única vez
+            self._restarted = True
+            self.owner.journal.mpu_clear(self.item["token"])
+            self._create(); return
+        self._finish(False, "", failed[0][3] if failed[0] else "parte falhou")
+
+    def _complete(self):
+        body = s3_complete_multipart_body(self.etags)
+        def completed(reply):
+            err = reply.errorString() if reply.error() != QNetworkReply.NoError else ""
+            if not err:
+                # O S3 pode responder 200 com <Error> no corpo
+                try:
+                    data = bytes(reply.readAll())
+                    if data and xml_local_name(ET.fromstring(data).tag) == "Error":
+                        err = s3_xml_field(data, "Message") or "CompleteMultipartUpload falhou"
+                except ET.ParseError:
+                    pass
+            if err:
+                self._finish(False, "", err); return
+            self.owner.journal.mpu_clear(self.item["token"])
+            self._finish(True, self.owner._public_url_for(self.key_path), "")
+        self._send("POST", {"uploadId": self.upload_id}, body, "Complete multipart", completed,
+                   content_type="application/xml")
+
+    # --- infraestrutura ---
+    def _send(self, method: str, params: dict, body: bytes, label: str, on_reply, content_type=None, payload_hash=None, stage=None):
+        reply = self.owner._s3_send(method, self.key_path, params, body, label=label, content_type=content_type,
+                                    payload_hash=payload_hash, stage=stage)
+        self._replies.add(reply)
+        def finished():
+            self._replies.discard(reply)
+            try:
+                on_reply(reply)
+            finally:
+                reply.deleteLater()
+        reply.finished.connect(finished)
+
+    def _finish(self, ok: bool, url: str, err: str):
+        if self._finished: return
+        self._finished = True
+        self.on_done(ok, self.key_path, url, err)
+
+# ===================== PUT com novas tentativas e hedge =====================
+class ResilientPut:
+    """PUT de uma imagem com novas tentativas e hedge opcional.
+
+    Falhas transitórias (`is_retryable`) voltam após `backoff_delay`; as
+    definitivas encerram na hora. Com `hedge_ms`, se a tentativa não terminar
+    nesse prazo (p95 recente dos PUTs), sai uma cópia idêntica para a mesma
+    chave e fica valendo a primeira que concluir; a outra é abortada. Tem
+    `abort()`, como o QNetworkReply que substitui.
+    """
+    BACKOFF_BASE = 0.5
+    BACKOFF_CAP = 8.0
+
+    def __init__(self, owner, item: dict, key_path: str, on_done, max_attempts: int = 4, hedge_ms: Optional[int] = None):
+        self.owner = owner
+        self.item = item
+        self.key_path = key_path
+        self.on_done = on_done
+        self.max_attempts = max(1, max_attempts)
+        self.hedge_ms = hedge_ms
+        self.attempt = 0
+        self._replies: set = set()
+        self._finished = False
+
+    def start(self):
+        self._next_attempt()
+        return self
+
+    def abort(self):
+        if self._finished: return
+        self._finished = True              # antes do abort(): os callbacks das replies são ignorados
+        for reply in list(self._replies): reply.abort()
+        self.on_done(False, self.key_path, "", "Operation canceled")
+
+    def _next_attempt(self):
+        if self._finished: return
+        self.attempt += 1
+        self._launch()
+        if self.hedge_ms:
+            QTimer.singleShot(self.hedge_ms, lambda n=self.attempt: self._hedge(n))
+
+    def _hedge(self, attempt: int):
+        if self._finished or attempt != self.attempt or len(self._replies) != 1: return
+        logger.info(f"PUT {self.item['filename']} passou do p95 ({self.hedge_ms}ms); disparando cópia (hedge)")
+        self._launch(hedge=True)
+
+    def _launch(self, hedge: bool = False):
+        try:
+            reply = self.owner._send_put(self.item, self.key_path, hedge)
+        except OSError as e:
+            self._finish(False, str(e)); return
+        self._replies.add(reply)
+        reply.finished.connect(lambda r=reply: self._on_reply(r))
+
+    def _on_reply(self, reply: QNetworkReply):
+        self._replies.discard(reply)
+        try:
+            if self._finished: return
+            if reply.error() == QNetworkReply.NoError:
+                self._finish(True, "")
+                for other in list(self._replies): other.abort()   # perdedor do hedge
+                return
+            if self._replies: return           # a outra cópia ainda pode concluir
+            st = reply.attribute(QNetworkRequest.HttpStatusCodeAttribute)
+            err = f"{reply.errorString()} (HTTP {st})" if st else reply.errorString()
+            if is_retryable(reply.error(), st) and self.attempt < self.max_attempts:
+                delay = backoff_delay(self.attempt, self.BACKOFF_BASE, self.BACKOFF_CAP)
+                logger.warning(f"PUT {self.item['filename']} falhou ({err}); tentativa {self.attempt + 1}/{self.max_attempts} em {delay:.1f}s")
+                QTimer.singleShot(int(delay * 1000), self._next_attempt)
+            else:
+                self._finish(False, err)
+        finally:
+            reply.deleteLater()
+
+    def _finish(self, ok: bool, err: str):
+        if self._finished: return
+        self._finished = True
+        self.on_done(ok, self.key_path, self.owner._public_url_for(self.key_path) if ok else "", err)
+
+# ===================== Caixa de saída do webhook =====================
+class WebhookOutbox(QObject):
+    """Entregas ao webhook persistidas na tabela `outbox` do diário.
+
+    Cada POST que falha é reagendado com backoff exponencial e jitter total
+    (entre 1 s e min(BACKOFF_CAP, BACKOFF_BASE * 2^tentativas)); respostas 4xx
+    definitivas (exceto 408/429) desistem na hora. No máximo `max_concurrent`
+    entregas ficam em voo, e `flush_now()` antecipa tudo quando a rede volta.
+    """
+    delivered = Signal(str)                      # job_id
+    retry_scheduled = Signal(str, int, float, str)  # job_id, tentativa, atraso (s), erro
+    gave_up = Signal(str, str)                   # job_id, erro
+
+    BACKOFF_BASE = 2.0
+    BACKOFF_CAP = 300.0
+    MAX_ATTEMPTS = 12
+
+    def __init__(self, journal: UploadJournal, nam: QNetworkAccessManager, max_concurrent: int = 2, parent=None):
+        super().__init__(parent)
+        self.journal = journal
+        self.nam = nam
+        self.max_concurrent = max(1, max_concurrent)
+        self._in_flight: dict = {}       # id da linha -> QNetworkReply
+        self._timer = QTimer(self); self._timer.setSingleShot(True); self._timer.timeout.connect(self.pump)
+
+    @property
+    def db(self):
+        return self.journal.db
+
+    def enqueue(self, job_id: str, url: str, body: bytes):
+        now = time.time()
+        self.db.execute("INSERT INTO outbox(job_id, url, body, attempts, next_at, created) VALUES(?,?,?,0,?,?)",
+                        (job_id, url, body, now, now))
+        self.db.commit()
+        self.pump()
+
+    def has_job(self, job_id: str) -> bool:
+        return self.db.execute("SELECT 1 FROM outbox WHERE job_id=?", (job_id,)).fetchone() is not None
+
+    def pending_count(self) -> int:
+        return self.db.execute("SELECT COUNT(*) FROM outbox").fetchone()[0]
+
+    def flush_now(self):
+        """Rede voltou: tudo que está esperando backoff sai já."""
+        self.db.execute("UPDATE outbox SET next_at=?", (time.time(),)); self.db.commit()
+        self.pump()
+
+    def pump(self):
+        now = time.time()
+        free = self.max_concurrent - len(self._in_flight)
+        if free > 0:
+            busy = ",".join(str(i) for i in self._in_flight) or "-1"
+            rows = self.db.execute(f"SELECT * FROM outbox WHERE next_at<=? AND id NOT IN ({busy}) ORDER BY next_at LIMIT ?",
+                                   (now, free)).fetchall()
+            for row in rows: self._deliver(row)
+        nxt = self.db.execute("SELECT MIN(next_at) FROM outbox WHERE next_at>?", (now,)).fetchone()[0]
+        if nxt is not None:
+            self._timer.start(max(0, int((nxt - now) * 1000)) + 50)
+
+    def _deliver(self, row):
+        req = QNetworkRequest(QUrl(row["url"]))
+        req.setHeader(QNetworkRequest.ContentTypeHeader, 'application/json')
+        reply = self.nam.post(req, QByteArray(row["body"]))
+        self._in_flight[row["id"]] = reply
+        row_id, job_id, attempts = row["id"], row["job_id"], row["attempts"] + 1
+        t0 = time.monotonic()
+
+        def done():
+            try:
+                self._in_flight.pop(row_id, None)
+                st = reply.attribute(QNetworkRequest.HttpStatusCodeAttribute)
+                metrics.record("webhook", (time.monotonic() - t0) * 1000, len(row["body"]), status=st, attempt=attempts)
+                if reply.error() == QNetworkReply.NoError and (st is None or st < 400):
+                    self.db.execute("DELETE FROM outbox WHERE id=?", (row_id,)); self.db.commit()
+                    self.delivered.emit(job_id)
+                else:
+                    err = f"{reply.errorString()} (HTTP {st})"
+                    fatal = st is not None and 400 <= st < 500 and st not in (408, 429)
+                    if fatal or attempts >= self.MAX_ATTEMPTS:
+                        self.db.execute("DELETE FROM outbox WHERE id=?", (row_id,)); self.db.commit()
+                        self.gave_up.emit(job_id, err)
+                    else:
+                        delay = max(1.0, backoff_delay(attempts, self.BACKOFF_BASE, self.BACKOFF_CAP))
+                        self.db.execute("UPDATE outbox SET attempts=?, next_at=?, last_error=? WHERE id=?",
+                                        (attempts, time.time() + delay, err, row_id))
+                        self.db.commit()
+                        self.retry_scheduled.emit(job_id, attempts, delay, err)
+            finally:
+                reply.deleteLater()
+                self.pump()
+        reply.finished.connect(done)
+
+# ===================== UI: Fila de imagens (modelo/visão) =====================
+class QueueModel(QAbstractListModel):
+    """Itens da fila (dicts) + miniaturas já reduzidas. A visão só pinta as linhas visíveis."""
+    TokenRole = Qt.UserRole + 1
+    PendingRole = Qt.UserRole + 2
+    THUMB_SIZE = QSize(60, 50)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.items: List[dict] = []
+        self._thumbs: dict = {}            # token -> QPixmap no tamanho exibido
+        self.dpr = 1.0
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.items)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid(): return None
+        item = self.items[index.row()]
+        if role == Qt.DisplayRole:
+            return f"{item['filename']} (processando…)" if item.get("pending") else item["filename"]
+        if role == Qt.DecorationRole: return self._thumbs.get(item["token"])
+        if role == Qt.ToolTipRole: return item["filename"]
+        if role == self.TokenRole: return item["token"]
+        if role == self.PendingRole: return bool(item.get("pending"))
+        return None
+
+    def row_of(self, token: str) -> int:
+        for i, item in enumerate(self.items):
+            if item["token"] == token: return i
+        return -1
+
+    def append(self, item: dict):
+        self.beginInsertRows(QModelIndex(), len(self.items), len(self.items))
+        self.items.append(item); self.endInsertRows()
+
+    def remove(self, token: str) -> Optional[dict]:
+        row = self.row_of(token)
+        if row < 0: return None
+        self.beginRemoveRows(QModelIndex(), row, row)
+        item = self.items.pop(row); self._thumbs.pop(token, None)
+        self.endRemoveRows()
+        return item
+
+    def clear(self):
+        self.beginResetModel(); self.items = []; self._thumbs.clear(); self.endResetModel()
+
+    def move_to(self, token: str, row: int) -> bool:
+        src = self.row_of(token)
+        if src < 0 or src == row: return False
+        self.beginMoveRows(QModelIndex(), src, src, QModelIndex(), row if row < src else row + 1)
+        self.items.insert(row, self.items.pop(src)); self.endMoveRows()
+        return True
+
+    def refresh(self, token: str):
+        row = self.row_of(token)
+        if row >= 0: self.dataChanged.emit(self.index(row), self.index(row))
+
+    def has_thumbnail(self, token: str) -> bool:
+        return token in self._thumbs
+
+    def set_thumbnail(self, token: str, thumb: QImage):
+        """Guarda só a miniatura já reduzida (nunca o pixmap em resolução cheia)."""
+        pm = QPixmap.fromImage(thumb.scaled(self.THUMB_SIZE * self.dpr, Qt.KeepAspectRatio, Qt.SmoothTransformation))
+        pm.setDevicePixelRatio(self.dpr); self._thumbs[token] = pm
+        self.refresh(token)
+
+class QueueItemDelegate(QStyledItemDelegate):
+    """Linha da fila: miniatura, nome (elidido) e botões ▲/X desenhados (sem widgets por item)."""
+    removeRequested = Signal(str)      # token
+    prioritizeRequested = Signal(str)  # token
+    ROW_HEIGHT = 60
+    BUTTON = 22
+
+    def sizeHint(self, option, index):
+        return QSize(option.rect.width(), self.ROW_HEIGHT)
+
+    def _button_rect(self, rect: QRect) -> QRect:
+        return QRect(rect.right() - self.BUTTON - 5, rect.center().y() - self.BUTTON // 2, self.BUTTON, self.BUTTON)
+
+    def _top_rect(self, rect: QRect) -> QRect:
+        return self._button_rect(rect).translated(-(self.BUTTON + 4), 0)
+
+    def _draw_button(self, painter, option, rect: QRect, label: str, hover_color: QColor):
+        hovered = bool(option.state & QStyle.State_MouseOver) and option.widget is not None \
+            and rect.contains(option.widget.viewport().mapFromGlobal(QCursor.pos()))
+        painter.setPen(Qt.NoPen); painter.setBrush(hover_color if hovered else QColor(255, 255, 255, 20))
+        painter.drawEllipse(rect)
+        painter.setPen(option.palette.text().color()); painter.drawText(rect, Qt.AlignCenter, label)
+
+    def paint(self, painter, option, index):
+        painter.save()
+        painter.setRenderHint(QPainter.Antialiasing)
+        rect = option.rect.adjusted(5, 5, -5, -5)
+        thumb_box = QRect(rect.left(), rect.center().y() - QueueModel.THUMB_SIZE.height() // 2, QueueModel.THUMB_SIZE.width(), QueueModel.THUMB_SIZE.height())
+        pm = index.data(Qt.DecorationRole)
+        if pm is not None:
+            size = pm.deviceIndependentSize().toSize()
+            painter.drawPixmap(QRect(thumb_box.center().x() - size.width() // 2 + 1, thumb_box.center().y() - size.height() // 2 + 1, size.width(), size.height()), pm)
+        else:
+            painter.fillRect(thumb_box, QColor(255, 255, 255, 12))
+        btn = self._button_rect(option.rect)
+        top = self._top_rect(option.rect) if index.row() > 0 else None   # o 1º já sobe primeiro
+        right = (top or btn).left()
+        text_rect = QRect(thumb_box.right() + 6, rect.top(), right - thumb_box.right() - 12, rect.height())
+        painter.setPen(QColor("#999") if index.data(QueueModel.PendingRole) else option.palette.text().color())
+        text = option.fontMetrics.elidedText(index.data(Qt.DisplayRole) or "", Qt.ElideMiddle, max(0, text_rect.width()))
+        painter.drawText(text_rect, Qt.AlignVCenter | Qt.AlignLeft, text)
+        if top is not None: self._draw_button(painter, option, top, "▲", QColor(80, 160, 255, 230))
+        self._draw_button(painter, option, btn, "X", QColor(255, 80, 80, 230))
+        painter.restore()
+
+    def editorEvent(self, event, model, option, index):
+        if event.type() == QEvent.MouseButtonRelease:
+            pos = event.position().toPoint()
+            if self._button_rect(option.rect).contains(pos):
+                self.removeRequested.emit(index.data(QueueModel.TokenRole)); return True
+            if index.row() > 0 and self._top_rect(option.rect).contains(pos):
+                self.prioritizeRequested.emit(index.data(QueueModel.TokenRole)); return True
+        return super().editorEvent(event, model, option, index)
 
 # ===================== Diálogo de Configurações =====================
 class SettingsDialog(QDialog):
@@ -135,6 +1472,97 @@ class SettingsDialog(QDialog):
         lay_w.addLayout(row_btns); lay_w.addWidget(self.status_lbl); lay_w.addStretch()
         tabs.addTab(tab_w, "Webhook")
 
+        # Aba Envio
+        tab_e = QWidget(); lay_e = QFormLayout(tab_e)
+        self.concurrency_input = QSpinBox(); self.concurrency_input.setRange(1, 8)
+        self.concurrency_input.setValue(self.settings.value("upload_concurrency", 4, int))
+        self.queue_max_input = QSpinBox(); self.queue_max_input.setRange(1, 500)
+        self.queue_max_input.setValue(self.settings.value("queue_max", 10, int))
+        self.concurrency_input.setToolTip("Quantas imagens sobem ao R2 ao mesmo tempo.")
+        lay_e.addRow("Uploads simultâneos:", self.concurrency_input)
+        self.queue_max_input.setToolTip("Máximo de imagens na fila de um orçamento (as imagens ficam em disco, não na memória).")
+        lay_e.addRow("Imagens por orçamento:", self.queue_max_input)
+        self.eager_upload_input = QCheckBox("Enviar imagens ao R2 assim que entram na fila")
+        self.eager_upload_input.setChecked(self.settings.value("eager_upload", False, bool))
+        self.eager_upload_input.setToolTip("Adianta os uploads enquanto os dados do cliente são preenchidos; imagens removidas são apagadas do bucket.")
+        lay_e.addRow(self.eager_upload_input)
+        self.multipart_input = QSpinBox(); self.multipart_input.setRange(0, 500); self.multipart_input.setSuffix(" MB")
+        self.multipart_input.setSpecialValueText("nunca")
+        self.multipart_input.setValue(self.settings.value("r2_multipart_threshold_mb", 8, int))
+        self.multipart_input.setToolTip("Imagens maiores que isso sobem em partes de 5 MB, em paralelo e retomáveis.")
+        lay_e.addRow("Upload em partes acima de:", self.multipart_input)
+        self.bandwidth_input = QSpinBox(); self.bandwidth_input.setRange(0, 100000); self.bandwidth_input.setSingleStep(128)
+        self.bandwidth_input.setSpecialValueText("sem limite"); self.bandwidth_input.setSuffix(" KB/s")
+        self.bandwidth_input.setValue(self.settings.value("net_upload_limit_kbps", 0, int))
+        self.bandwidth_input.setToolTip("Teto somado de todos os uploads ao mesmo tempo, para sobrar banda para chamadas.")
+        lay_e.addRow("Limite de upload:", self.bandwidth_input)
+        self.bandwidth_auto_input = QCheckBox("Reduzir o upload quando a latência subir (automático)")
+        self.bandwidth_auto_input.setChecked(self.settings.value("net_upload_auto", False, bool))
+        self.bandwidth_auto_input.setToolTip("Mede o RTT durante os envios e baixa a taxa quando a conexão começa a enfileirar;\n"
+                                             "o limite acima vira o teto.")
+        lay_e.addRow(self.bandwidth_auto_input)
+        self.deferred_delete_input = QCheckBox("Adiar limpeza do bucket (agrupa vários orçamentos)")
+        self.deferred_delete_input.setChecked(self.settings.value("r2_delete_deferred", False, bool))
+        self.deferred_delete_input.setToolTip("Junta as chaves de vários envios e remove tudo numa única requisição quando o app fica ocioso.")
+        lay_e.addRow(self.deferred_delete_input)
+        self.content_addressed_input = QCheckBox("Reaproveitar imagens já enviadas (chave pelo conteúdo)")
+        self.content_addressed_input.setChecked(self.settings.value("r2_content_addressed", False, bool))
+        self.content_addressed_input.setToolTip("A mesma imagem (tabela de preços, catálogo) sobe uma vez só e o link é reutilizado nos próximos orçamentos.\n"
+                                                "O objeto só sai do bucket quando nenhum orçamento o usa há mais que o prazo abaixo.")
+        lay_e.addRow(self.content_addressed_input)
+        self.reuse_ttl_input = QSpinBox(); self.reuse_ttl_input.setRange(0, 365); self.reuse_ttl_input.setSuffix(" dias")
+        self.reuse_ttl_input.setSpecialValueText("apagar logo")
+        self.reuse_ttl_input.setValue(self.settings.value("r2_reuse_ttl_days", 30, int))
+        lay_e.addRow("Manter imagens reaproveitáveis por:", self.reuse_ttl_input)
+        self.unsigned_payload_input = QCheckBox("Não assinar o corpo dos uploads (UNSIGNED-PAYLOAD, só HTTPS)")
+        self.unsigned_payload_input.setChecked(self.settings.value("r2_unsigned_payload", False, bool))
+        self.unsigned_payload_input.setToolTip("Assina os PUTs de imagens e as partes de multipart sem o SHA-256 do corpo; a integridade fica por conta do TLS.")
+        lay_e.addRow(self.unsigned_payload_input)
+        self.http2_input = QCheckBox("Usar HTTP/2 com o R2 quando disponível")
+        self.http2_input.setChecked(self.settings.value("net_http2", True, bool))
+        self.http2_input.setToolTip("Multiplexa os uploads numa só conexão; desmarcado, usa HTTP/1.1 com keep-alive.")
+        lay_e.addRow(self.http2_input)
+        self.hedge_input = QCheckBox("Duplicar uploads lentos (hedge no p95)")
+        self.hedge_input.setChecked(self.settings.value("r2_hedge_puts", False, bool))
+        self.hedge_input.setToolTip("Se um upload passar do tempo de 95% dos uploads recentes, envia uma cópia e fica com a que terminar primeiro.\n"
+                                    "Corta a cauda de latência em Wi-Fi congestionado, ao custo de alguns bytes a mais.")
+        lay_e.addRow(self.hedge_input)
+        tabs.addTab(tab_e, "Envio")
+
+        # Aba Imagens
+        tab_i = QWidget(); lay_i = QFormLayout(tab_i)
+        self.img_format_input = QComboBox()
+        for label, value in (("Automático (PNG p/ prints, JPEG p/ fotos)", "auto"), ("Sempre PNG", "png"), ("Sempre JPEG", "jpeg"), ("WebP p/ fotos", "webp")):
+            self.img_format_input.addItem(label, value)
+        self.img_format_input.setCurrentIndex(max(0, self.img_format_input.findData(self.settings.value("img_format", ENCODE_DEFAULTS["format"]))))
+        self.img_max_edge_input = QSpinBox(); self.img_max_edge_input.setRange(0, 10000); self.img_max_edge_input.setSingleStep(256)
+        self.img_max_edge_input.setSpecialValueText("sem limite"); self.img_max_edge_input.setSuffix(" px")
+        self.img_max_edge_input.setValue(self.settings.value("img_max_edge", ENCODE_DEFAULTS["max_edge"], int))
+        self.img_max_kb_input = QSpinBox(); self.img_max_kb_input.setRange(0, 50000); self.img_max_kb_input.setSingleStep(250)
+        self.img_max_kb_input.setSpecialValueText("sem limite"); self.img_max_kb_input.setSuffix(" KB")
+        self.img_max_kb_input.setValue(self.settings.value("img_max_kb", ENCODE_DEFAULTS["max_kb"], int))
+        self.img_quality_input = QSpinBox(); self.img_quality_input.setRange(40, 100)
+        self.img_quality_input.setValue(self.settings.value("img_quality", ENCODE_DEFAULTS["quality"], int))
+        lay_i.addRow("Formato:", self.img_format_input)
+        lay_i.addRow("Maior lado:", self.img_max_edge_input)
+        lay_i.addRow("Tamanho máx. por imagem:", self.img_max_kb_input)
+        lay_i.addRow("Qualidade JPEG/WebP:", self.img_quality_input)
+        tabs.addTab(tab_i, "Imagens")
+
+        # Aba Diagnóstico
+        tab_d = QWidget(); lay_d = QVBoxLayout(tab_d)
+        self.diag_table = QTableWidget(0, 6)
+        self.diag_table.setHorizontalHeaderLabels(["Etapa", "Amostras", "p50 (ms)", "p95 (ms)", "Tam. médio", "Vazão p50"])
+        self.diag_table.verticalHeader().setVisible(False)
+        self.diag_table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.diag_table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeToContents)
+        btn_refresh = QPushButton("Atualizar"); btn_refresh.clicked.connect(self.refresh_diagnostics)
+        row_d = QHBoxLayout(); row_d.addStretch(); row_d.addWidget(btn_refresh)
+        lay_d.addWidget(QLabel(f"Últimas {PipelineMetrics.WINDOW} amostras por etapa (desde a abertura do app)."))
+        lay_d.addWidget(self.diag_table, 1); lay_d.addLayout(row_d)
+        tabs.addTab(tab_d, "Diagnóstico")
+        self.refresh_diagnostics()
+
         box = QDialogButtonBox(QDialogButtonBox.Save | QDialogButtonBox.Cancel)
         box.accepted.connect(self.accept); box.rejected.connect(self.reject)
         main.addWidget(box)
@@ -179,9 +1607,37 @@ class SettingsDialog(QDialog):
             self.status_lbl.setText(f"Falha ao iniciar teste: {e}")
             self.status_lbl.setStyleSheet("color:#dc3545;")
 
+    def refresh_diagnostics(self):
+        summary = metrics.summary()
+        stages = [k for k in STAGE_LABELS if k in summary] + [k for k in summary if k not in STAGE_LABELS]
+        self.diag_table.setRowCount(len(stages))
+        for row, stage in enumerate(stages):
+            m = summary[stage]
+            cells = (STAGE_LABELS.get(stage, stage), str(m["n"]), f"{m['p50']:.1f}", f"{m['p95']:.1f}",
+                     f"{m['bytes_avg'] / 1024:.1f} KB" if m["bytes_avg"] else "-",
+                     f"{m['kbps_p50']:.0f} KB/s" if m["kbps_p50"] else "-")
+            for col, text in enumerate(cells):
+                self.diag_table.setItem(row, col, QTableWidgetItem(text))
+
     def accept(self):
         self.settings.setValue("seller_name", self.seller_name_input.text().strip())
         self.settings.setValue("webhook_url", self.webhook_url_input.text().strip())
+        self.settings.setValue("upload_concurrency", self.concurrency_input.value())
+        self.settings.setValue("queue_max", self.queue_max_input.value())
+        self.settings.setValue("eager_upload", self.eager_upload_input.isChecked())
+        self.settings.setValue("r2_multipart_threshold_mb", self.multipart_input.value())
+        self.settings.setValue("net_upload_limit_kbps", self.bandwidth_input.value())
+        self.settings.setValue("net_upload_auto", self.bandwidth_auto_input.isChecked())
+        self.settings.setValue("r2_delete_deferred", self.deferred_delete_input.isChecked())
+        self.settings.setValue("r2_content_addressed", self.content_addressed_input.isChecked())
+        self.settings.setValue("r2_reuse_ttl_days", self.reuse_ttl_input.value())
+        self.settings.setValue("r2_unsigned_payload", self.unsigned_payload_input.isChecked())
+        self.settings.setValue("r2_hedge_puts", self.hedge_input.isChecked())
+        self.settings.setValue("net_http2", self.http2_input.isChecked())
+        self.settings.setValue("img_format", self.img_format_input.currentData())
+        self.settings.setValue("img_max_edge", self.img_max_edge_input.value())
+        self.settings.setValue("img_max_kb", self.img_max_kb_input.value())
+        self.settings.setValue("img_quality", self.img_quality_input.value())
         self.settings.sync(); super().accept()
 
     def closeEvent(self, e):
@@ -195,11 +1651,52 @@ class SettingsDialog(QDialog):
 # ===================== Janela Principal =====================
 class FloatingWidget(QWidget):
     RESIZE_MARGIN = 6
+    DELETE_BATCH_MAX = 1000        # limite do S3 DeleteObjects por requisição
+    DELETE_MAX_ATTEMPTS = 3
+    DELETE_BACKOFF = (1.0, 30.0)   # base, teto (s)
+    PUT_MAX_ATTEMPTS = 4
+    HEDGE_MIN_SAMPLES = 10         # PUTs medidos antes de confiar no p95
+    HEDGE_MIN_MS = 500
+    DELETE_IDLE_MS = 15000         # ociosidade antes de descarregar exclusões adiadas
+    PROBE_INTERVAL_MS = 30000      # probe de conectividade enquanto há webhooks pendentes
+    RTT_PROBE_MS = 1000            # amostra de RTT durante uploads (limite de banda automático)
+    MULTIPART_PART_SIZE = 5 * 1024 * 1024   # mínimo do S3; o R2 exige partes de mesmo tamanho (exceto a última)
 
     def __init__(self):
         super().__init__()
-        self.image_queue: List[dict] = []
+        self.queue_model = QueueModel(self)
         self.settings = QSettings("OmniForge", "AppOrcamento")
+        self._sends_in_progress = 0
+        self.upload_budget = UploadBudget()
+        self.bandwidth = BandwidthLimiter(self)
+        self._rtt_timer = QTimer(self); self._rtt_timer.setInterval(self.RTT_PROBE_MS)
+        self._rtt_timer.timeout.connect(self._rtt_probe)
+        self._jobs: dict = {}              # job_id -> {"label", "total", "state", "row", "actions"} (lista de progresso)
+        self._shared_puts: dict = {}       # sha256 -> upload em voo (chaves por conteúdo; um PUT por imagem)
+        self._putting: set = set()         # chaves por conteúdo com PUT em voo (a limpeza adiada não as toca)
+        self._deleting: set = set()        # chaves num DeleteObjects em voo
+        self._after_deletes: list = []     # PUTs dessas chaves, liberados quando a limpeza termina
+        self._pending_deletes: List[str] = []
+        self._delete_flush_timer = QTimer(self); self._delete_flush_timer.setSingleShot(True)
+        self._delete_flush_timer.timeout.connect(self._flush_pending_deletes)
+
+        # Codificação PNG/hash fora da thread da GUI (deixa 1 núcleo livre para a interface)
+        self._encode_pool = QThreadPool(self)
+        self._encode_pool.setMaxThreadCount(max(1, QThread.idealThreadCount() - 1))
+        self._encoding: dict = {}          # token -> item aguardando codificação
+        self._encode_tasks: dict = {}      # token -> EncodeTask (mantém viva até o sinal chegar)
+        self._encode_waiters: List[tuple] = []
+        self._thumb_tasks: dict = {}       # token -> ThumbnailTask
+
+        # Upload antecipado (itens ainda na fila)
+        self._eager_backlog: List[dict] = []
+        self._eager_in_flight = 0
+
+        # Diário em disco: rascunho da fila atual + envios não concluídos
+        self.journal = UploadJournal(UploadJournal.default_root())
+        self.thumbs = ThumbnailCache(UploadJournal.default_root() / "thumbs")
+        self._draft_id = self.journal.new_draft()
+        self._item_pos = 0
 
         # Sem moldura, sempre no topo
         self.setWindowFlags(Qt.FramelessWindowHint | Qt.WindowStaysOnTopHint)
@@ -241,18 +1738,26 @@ class FloatingWidget(QWidget):
         title_row.addWidget(self.title); title_row.addStretch(); title_row.addWidget(self.settings_btn)
         title_row.addWidget(self.minimize_btn); title_row.addWidget(self.close_btn)
 
-        self.scroll = QScrollArea(); self.scroll.setWidgetResizable(True)
-        self.scroll.setStyleSheet("QScrollArea{border:none;background:transparent;}")
-        self.scroll.setSizePolicy(QSizePolicy.Ignored, QSizePolicy.Expanding)  # permite afinar o layout
-        self.image_list = QWidget()
-        self.image_list_layout = QVBoxLayout(self.image_list); self.image_list_layout.setAlignment(Qt.AlignTop)
-        self.image_list_layout.setContentsMargins(0,4,0,4); self.image_list_layout.setSpacing(6)
-        self.scroll.setWidget(self.image_list)
+        # Fila virtualizada: uma linha pintada pelo delegate, sem widget por item
+        self.queue_area = QWidget(); self.queue_area.setSizePolicy(QSizePolicy.Ignored, QSizePolicy.Expanding)  # permite afinar o layout
+        queue_lay = QVBoxLayout(self.queue_area); queue_lay.setContentsMargins(0,4,0,4); queue_lay.setSpacing(0)
+        self.queue_view = QListView(); self.queue_view.setModel(self.queue_model)
+        self.queue_delegate = QueueItemDelegate(self.queue_view); self.queue_view.setItemDelegate(self.queue_delegate)
+        self.queue_delegate.removeRequested.connect(self.remove_image)
+        self.queue_delegate.prioritizeRequested.connect(self.prioritize_image)
+        self.queue_view.setContextMenuPolicy(Qt.CustomContextMenu)
+        self.queue_view.customContextMenuRequested.connect(self._queue_context_menu)
+        self.queue_view.setUniformItemSizes(True); self.queue_view.setMouseTracking(True)
+        self.queue_view.setSelectionMode(QAbstractItemView.NoSelection); self.queue_view.setFocusPolicy(Qt.NoFocus)
+        self.queue_view.setVerticalScrollMode(QAbstractItemView.ScrollPerPixel)
+        self.queue_view.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+        self.queue_view.setStyleSheet("QListView{border:none;background:transparent;}")
+        self.queue_model.dpr = self.devicePixelRatioF()
         self.hint_label = QLabel("Cole uma imagem (Ctrl+V) ou arraste & solte arquivos aqui.")
         self.hint_label.setWordWrap(True)
         self.hint_label.setAlignment(Qt.AlignCenter); self.hint_label.setStyleSheet("color:#999; font-size:11px;")
         self.hint_label.setSizePolicy(QSizePolicy.Ignored, QSizePolicy.Preferred)
-        self.image_list_layout.addWidget(self.hint_label)
+        queue_lay.addWidget(self.hint_label); queue_lay.addWidget(self.queue_view, 1)
 
         # Frente: Cliente/Telefone/Conversa (vendedor só nas Configurações)
         self.client_name = QLineEdit(); self.client_name.setPlaceholderText("Nome do Cliente (opcional)")
@@ -269,7 +1774,7 @@ class FloatingWidget(QWidget):
         self.form_stack.addWidget(row_w)   # 0 = largo
         self.form_stack.addWidget(col_w)   # 1 = estreito
 
-        self.queue_lbl = QLabel("Fila: 0/10"); self.queue_lbl.setSizePolicy(QSizePolicy.Ignored, QSizePolicy.Fixed)
+        self.queue_lbl = QLabel("Fila: 0"); self.queue_lbl.setSizePolicy(QSizePolicy.Ignored, QSizePolicy.Fixed)
         self.status_lbl = QLabel("Pronto."); self.status_lbl.setObjectName("statusLabel"); self.status_lbl.setSizePolicy(QSizePolicy.Ignored, QSizePolicy.Fixed)
 
         self.send_btn = QPushButton("Enviar Orçamento"); self.send_btn.setObjectName("sendButton")
@@ -279,8 +1784,17 @@ class FloatingWidget(QWidget):
 
         btn_row = QHBoxLayout(); btn_row.addStretch(); btn_row.addWidget(self.send_btn)
 
-        lay.addLayout(title_row); lay.addWidget(self.scroll, 1); lay.addLayout(self.form_stack)
-        lay.addWidget(self.queue_lbl); lay.addWidget(self.status_lbl); lay.addLayout(btn_row)
+        lay.addLayout(title_row); lay.addWidget(self.queue_area, 1); lay.addLayout(self.form_stack)
+        # Orçamentos em andamento (um por "Enviar"); some quando não há nenhum
+        self.jobs_list = QListWidget(); self.jobs_list.setObjectName("jobsList")
+        self.jobs_list.setSelectionMode(QAbstractItemView.NoSelection); self.jobs_list.setFocusPolicy(Qt.NoFocus)
+        self.jobs_list.setStyleSheet("QListWidget{border:none;background:transparent;font-size:11px;}")
+        self.jobs_list.setSizePolicy(QSizePolicy.Ignored, QSizePolicy.Fixed); self.jobs_list.setMaximumHeight(66)
+        self.jobs_list.setContextMenuPolicy(Qt.CustomContextMenu)
+        self.jobs_list.customContextMenuRequested.connect(self._jobs_context_menu)
+        self.jobs_list.hide()
+
+        lay.addWidget(self.queue_lbl); lay.addWidget(self.jobs_list); lay.addWidget(self.status_lbl); lay.addLayout(btn_row)
 
         # Grips nos cantos para ajuste manual
         self.grip_tl = QSizeGrip(self); self.grip_tr = QSizeGrip(self); self.grip_bl = QSizeGrip(self); self.grip_br = QSizeGrip(self)
@@ -289,6 +1803,15 @@ class FloatingWidget(QWidget):
         QShortcut(QKeySequence.Paste, self, activated=self.handle_paste)
         self.nam = QNetworkAccessManager(self)
 
+        # Caixa de saída do webhook + probe periódico enquanto houver entregas pendentes
+        self.outbox = WebhookOutbox(self.journal, self.nam, max_concurrent=2, parent=self)
+        self.outbox.delivered.connect(self._on_webhook_delivered)
+        self.outbox.retry_scheduled.connect(self._on_webhook_retry)
+        self.outbox.gave_up.connect(self._on_webhook_gave_up)
+        self._online = True
+        self._probe_timer = QTimer(self); self._probe_timer.setInterval(self.PROBE_INTERVAL_MS)
+        self._probe_timer.timeout.connect(lambda: self._connectivity_probe(periodic=True))
+
         self._init_tray()
         self.load_settings()
         self._update_form_mode()
@@ -297,6 +1820,12 @@ class FloatingWidget(QWidget):
         # Probe silencioso (não mostra nada além do status)
         self._connectivity_probe()
 
+        # Exclusões adiadas que ficaram de uma sessão anterior
+        self._restore_pending_deletes()
+
+        # Retoma a fila e os envios interrompidos
+        QTimer.singleShot(0, self._resume_journal)
+
     # ------------------- Tray -------------------
     def _init_tray(self):
         if not QSystemTrayIcon.isSystemTrayAvailable(): return
@@ -321,6 +1850,16 @@ class FloatingWidget(QWidget):
     def restore_from_tray(self):
         self.show(); self.raise_(); self.activateWindow()
 
+    def showEvent(self, event):
+        # Janela visível = envio provável em breve: deixa a conexão TLS com o R2 pronta
+        self.transport.warmup()
+        super().showEvent(event)
+
+    def closeEvent(self, event):
+        # A fila (inclusive uploads antecipados) fica no diário e volta na próxima abertura
+        self.journal.close()
+        super().closeEvent(event)
+
     def changeEvent(self, event):
         if event.type() == QEvent.WindowStateChange and self.isMinimized():
             QTimer.singleShot(0, self.to_tray)
@@ -432,7 +1971,7 @@ class FloatingWidget(QWidget):
 
     # ------------------- DnD / Clipboard -------------------
     def dragEnterEvent(self, event):
-        if (event.mimeData().hasUrls() or event.mimeData().hasImage()) and len(self.image_queue) < 10:
+        if (event.mimeData().hasUrls() or event.mimeData().hasImage()) and len(self.image_queue) < self.QUEUE_MAX:
             event.acceptProposedAction()
         else:
             event.ignore()
@@ -444,55 +1983,154 @@ class FloatingWidget(QWidget):
         elif md.hasUrls():
             for url in md.urls():
                 p = Path(url.toLocalFile())
-                if p.is_file() and len(self.image_queue) < 10:
-                    pm = QPixmap(str(p))
-                    if not pm.isNull(): self.enqueue_image(pm, filename=p.name)
+                if p.is_file() and len(self.image_queue) < self.QUEUE_MAX:
+                    self.enqueue_file(p)
 
     def handle_paste(self):
-        if len(self.image_queue) >= 10: return
+        if len(self.image_queue) >= self.QUEUE_MAX: return
         img = QGuiApplication.clipboard().image()
         if not img.isNull(): self.enqueue_image(img)
 
     # ------------------- Fila / Envio -------------------
     def enqueue_image(self, qimg_or_pix, filename: Optional[str] = None):
-        if len(self.image_queue) >= 10: self.status("Fila cheia."); return
+        if len(self.image_queue) >= self.QUEUE_MAX: self.status("Fila cheia."); return
         if not self.image_queue: self.hint_label.hide()
         if not filename:
             filename = f"img-{datetime.datetime.now().strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}.png"
 
         if isinstance(qimg_or_pix, QPixmap):
-            pm = qimg_or_pix
+            qimg = qimg_or_pix.toImage()               # já é uma cópia independente
         else:
-            pm = QPixmap.fromImage(qimg_or_pix)
+            qimg = qimg_or_pix.copy()                  # deep copy: buffer do clipboard é volátil
+
+        item = self._add_pending_item(filename)
+        self._start_encode(item, EncodeTask(item["token"], qimg, self.ENCODE_POLICY, self.journal.spool_dir, self.thumbs))
+
+    def enqueue_file(self, path: Path):
+        """Arquivo local: a leitura, a miniatura e a eventual recodificação ficam no worker."""
+        if len(self.image_queue) >= self.QUEUE_MAX: self.status("Fila cheia."); return
+        if not is_image_file(str(path)):               # PDF/ZIP nem entram na fila (nem contam no limite)
+            self.status(f"'{path.name}' não é uma imagem."); return
+        if not self.image_queue: self.hint_label.hide()
+        item = self._add_pending_item(path.name)
+        self._start_encode(item, FileImportTask(item["token"], str(path), self.ENCODE_POLICY, self.journal.spool_dir, self.thumbs))
 
-        data = qimage_to_png_bytes(pm)                 # deep copy garantido
-        digest = sha256_hex(data)[:8]
+    def _add_pending_item(self, filename: str) -> dict:
         token  = uuid.uuid4().hex[:8]
         safe_name = filename.replace("/", "_").replace("\\", "_")
-        self.image_queue.append({"token": token, "filename": safe_name, "data": data, "sha": digest})
+        item = {"token": token, "filename": safe_name, "data": None, "sha": "", "sha256": "", "mime": "", "pending": True,
+                "job": self._draft_id, "pos": self._item_pos}
+        self._item_pos += 1
 
-        preview = ImagePreviewItem(pm, safe_name, token)
-        preview.removed.connect(self.remove_image)
-        self.image_list_layout.addWidget(preview)
+        # Linha provisória imediata; miniatura, bytes e digest chegam por _on_encoded
+        self.queue_model.append(item)
         self.update_queue_label(); self.status(f"Imagem '{safe_name}' adicionada.")
-
-    @Slot(QWidget)
-    def remove_image(self, item_widget):
-        tok = item_widget._token
-        self.image_queue = [x for x in self.image_queue if x["token"] != tok]
-        item_widget.deleteLater()
+        return item
+
+    def _start_encode(self, item: dict, task: EncodeTask):
+        task.signals.preview.connect(self._on_encode_preview)
+        task.signals.done.connect(self._on_encoded)
+        task.signals.failed.connect(self._on_encode_failed)
+        self._encoding[item["token"]] = item; self._encode_tasks[item["token"]] = task
+        self._encode_pool.start(task)
+
+    @Slot(str, object)
+    def _on_encode_preview(self, token: str, thumb: QImage):
+        if token in self._encoding and not thumb.isNull(): self.queue_model.set_thumbnail(token, thumb)
+
+    @Slot(str, object)
+    def _on_encoded(self, token: str, result: dict):
+        self._encode_tasks.pop(token, None)
+        item = self._encoding.pop(token, None)
+        if item is None:  # removida antes de terminar
+            UploadJournal._unlink(result.get("path")); return
+        _, mime, ext = IMAGE_FORMATS[result["format"]]
+        filename = os.path.splitext(item["filename"])[0] + ext
+        sha256 = result["sha256"]
+        # Com spool, os bytes ficam só no disco; em memória (QByteArray) apenas sem diário gravável
+        item.update(data=result["data"], size=result["size"], sha=sha256[:8], sha256=sha256,
+                    mime=mime, filename=filename, path=result["path"], pending=False)
+        self.journal.add_item(item["job"], item)
+        self.queue_model.refresh(token)
+        if result.get("thumb") is not None and not result["thumb"].isNull() and not self.queue_model.has_thumbnail(token):
+            self.queue_model.set_thumbnail(token, result["thumb"])
+        if self.EAGER_UPLOAD and not item.get("discarded"):
+            self._eager_backlog.append(item); self._pump_eager()
+        self._check_encode_waiters()
+
+    @Slot(str, str)
+    def _on_encode_failed(self, token: str, err: str):
+        self._encode_tasks.pop(token, None)
+        item = self._encoding.pop(token, None)
+        if item is None: return
+        item["pending"] = False
+        logger.error(f"Falha ao codificar '{item['filename']}': {err}")
+        self.status(f"Falha ao processar '{item['filename']}'.")
+        if self.queue_model.row_of(token) >= 0: self.remove_image(token)
+        self._check_encode_waiters()
+
+    def _when_encoded(self, items: List[dict], callback):
+        """Chama `callback(prontos)` assim que nenhum dos itens estiver mais codificando."""
+        self._encode_waiters.append((items, callback))
+        self._check_encode_waiters()
+
+    def _check_encode_waiters(self):
+        for waiter in [w for w in self._encode_waiters if not any(i.get("pending") for i in w[0])]:
+            self._encode_waiters.remove(waiter)
+            items, callback = waiter
+            callback([i for i in items if i.get("size") or (i.get("upload") or {}).get("state") == "done"])
+
+    @Slot(str)
+    def remove_image(self, tok: str):
+        item = self.queue_model.remove(tok)
+        self._cancel_item(tok, item)
         self.update_queue_label()
         if not self.image_queue: self.hint_label.show()
 
-    def clear_queue(self):
-        self.image_queue.clear()
-        for i in reversed(range(self.image_list_layout.count())):
-            w = self.image_list_layout.itemAt(i).widget()
-            if w and w is not self.hint_label: w.setParent(None); w.deleteLater()
+    def _cancel_item(self, tok: str, item: Optional[dict]):
+        """Item saiu da fila: tira do pool a codificação que nem começou e aborta o upload em voo."""
+        for tasks in (self._encode_tasks, self._thumb_tasks):
+            task = tasks.get(tok)
+            if task is not None and self._encode_pool.tryTake(task): tasks.pop(tok, None)
+        self._encoding.pop(tok, None)
+        if item is not None: self._discard_upload(item)
+        self.journal.remove_item(tok)
+
+    @Slot(str)
+    def prioritize_image(self, tok: str):
+        """Passa o item para o topo: é o próximo a subir (antecipado) e o 1º do orçamento."""
+        if not self.queue_model.move_to(tok, 0): return
+        for i, item in enumerate(self.image_queue): item["pos"] = i
+        self.journal.reorder([i["token"] for i in self.image_queue])
+        item = self.image_queue[0]
+        if item in self._eager_backlog:
+            self._eager_backlog.remove(item); self._eager_backlog.insert(0, item)
+        self.status(f"'{item['filename']}' passou para o topo da fila.")
+
+    def _queue_context_menu(self, pos: QPoint):
+        index = self.queue_view.indexAt(pos)
+        menu = QMenu(self)
+        if index.isValid():
+            tok = index.data(QueueModel.TokenRole)
+            if index.row() > 0: menu.addAction("Enviar primeiro", lambda: self.prioritize_image(tok))
+            menu.addAction("Remover", lambda: self.remove_image(tok))
+            menu.addSeparator()
+        if self.image_queue: menu.addAction("Limpar fila", lambda: self.clear_queue())
+        if not menu.isEmpty(): menu.exec(self.queue_view.viewport().mapToGlobal(pos))
+
+    def clear_queue(self, discard: bool = True):
+        """Esvazia a fila visual. Com `discard=False` os itens seguem vivos (envio em andamento)."""
+        if discard:
+            for x in list(self.image_queue): self._cancel_item(x["token"], x)
+        self.queue_model.clear()
         self.hint_label.show(); self.update_queue_label()
 
+    @property
+    def image_queue(self) -> List[dict]:
+        return self.queue_model.items
+
     def update_queue_label(self):
-        self.queue_lbl.setText(f"Fila: {len(self.image_queue)}/10")
+        self.queue_lbl.setText(f"Fila: {len(self.image_queue)}/{self.QUEUE_MAX}")
 
     def status(self, text: str):
         self.status_lbl.setText(text or "")
@@ -503,6 +2141,23 @@ class FloatingWidget(QWidget):
         self.SELLER_NAME = s.value("seller_name", "")
         if not self.WEBHOOK_URL or not self.SELLER_NAME:
             self.status("Configure o nome do vendedor e o webhook em ⚙️")
+        self.UPLOAD_CONCURRENCY = max(1, s.value("upload_concurrency", 4, int))
+        self.upload_budget.set_limit(self.UPLOAD_CONCURRENCY)
+        self.QUEUE_MAX = max(1, s.value("queue_max", 10, int))
+        self.EAGER_UPLOAD = s.value("eager_upload", False, bool)
+        self.MULTIPART_THRESHOLD = max(0, s.value("r2_multipart_threshold_mb", 8, int)) * 1024 * 1024
+        self.DELETE_DEFERRED = s.value("r2_delete_deferred", False, bool)
+        put_kbps = (metrics.summary().get("put") or {}).get("kbps_p50") or 0   # ponto de partida do automático (só PUTs sem limite)
+        self.bandwidth.configure(max(0, s.value("net_upload_limit_kbps", 0, int)) * 1024,
+                                 s.value("net_upload_auto", False, bool), put_kbps * 1024)
+        self.CONTENT_ADDRESSED = s.value("r2_content_addressed", False, bool)
+        self.REUSE_TTL_DAYS = max(0, s.value("r2_reuse_ttl_days", 30, int))
+        self.ENCODE_POLICY = {
+            "format":   s.value("img_format",   ENCODE_DEFAULTS["format"]) or "auto",
+            "max_edge": s.value("img_max_edge", ENCODE_DEFAULTS["max_edge"], int),
+            "max_kb":   s.value("img_max_kb",   ENCODE_DEFAULTS["max_kb"], int),
+            "quality":  s.value("img_quality",  ENCODE_DEFAULTS["quality"], int),
+        }
         # R2 oculto
         self.R2_ACCOUNT_ID  = s.value("r2_account_id",  R2_DEFAULTS["account_id"])
         self.R2_BUCKET      = s.value("r2_bucket",      R2_DEFAULTS["bucket"])
@@ -512,6 +2167,11 @@ class FloatingWidget(QWidget):
         self.R2_CACHE       = s.value("r2_cache",       R2_DEFAULTS["cache_ctrl"])
         self.R2_KEY_ID      = s.value("r2_key_id",      R2_DEFAULTS["key_id"])
         self.R2_KEY_SECRET  = s.value("r2_key_secret",  R2_DEFAULTS["key_secret"])
+        self.R2_UNSIGNED_PAYLOAD = s.value("r2_unsigned_payload", False, bool)
+        self.HEDGE_PUTS = s.value("r2_hedge_puts", False, bool)
+        self.signer = SigV4Signer(self.R2_KEY_ID, self.R2_KEY_SECRET, "auto", "s3")
+        if getattr(self, "transport", None) is not None: self.transport.deleteLater()
+        self.transport = R2Transport(self.nam, self.R2_ENDPOINT, http2=s.value("net_http2", True, bool), parent=self)
 
     def open_settings(self):
         dlg = SettingsDialog(self)
@@ -519,170 +2179,560 @@ class FloatingWidget(QWidget):
             self.load_settings(); self.status("Configurações salvas.")
 
     # ---------- Conectividade silenciosa ----------
-    def _connectivity_probe(self):
+    def _connectivity_probe(self, periodic: bool = False):
         if not self.R2_PUBLIC_BASE: return
-        req = QNetworkRequest(QUrl(self.R2_PUBLIC_BASE + "/"))
-        req.setAttribute(QNetworkRequest.Http2AllowedAttribute, False)
-        reply = self.nam.head(req)
+        req = self.transport.request(QUrl(self.R2_PUBLIC_BASE + "/"))
+        reply = self.transport.track(self.nam.head(req), "HEAD probe")
         def done():
             try:
-                if reply.error() == QNetworkReply.NoError:
-                    self.status("Conectado.")
-                else:
-                    self.status("Atenção: verifique sua Internet.")
+                # Qualquer resposta HTTP (até 404) prova que há rede
+                online = reply.error() == QNetworkReply.NoError or reply.attribute(QNetworkRequest.HttpStatusCodeAttribute) is not None
+                came_back = online and not self._online
+                self._online = online
+                if not periodic or came_back:
+                    self.status("Conectado." if online else "Atenção: verifique sua Internet.")
+                if came_back and self.outbox.pending_count():
+                    logger.info("Conexão restabelecida; reenviando webhooks pendentes")
+                    self.outbox.flush_now()
+                if not self.outbox.pending_count(): self._probe_timer.stop()
             finally:
                 reply.deleteLater()
         reply.finished.connect(done)
 
     # ---------- Assinatura AWS V4 (R2) ----------
-    def _build_s3_headers(self, method: str, key_path: str, payload: bytes, content_type: Optional[str] = None):
-        region, service = "auto", "s3"
-        host = QUrl(self.R2_ENDPOINT).host()
-        amz_date, date_stamp = iso8601_basic(datetime.datetime.utcnow())
-        canonical_uri = f"/{self.R2_BUCKET}/{key_path}"
-        payload_hash = sha256_hex(payload)
-        canonical_headers = f"host:{host}\n" f"x-amz-content-sha256:{payload_hash}\n" f"x-amz-date:{amz_date}\n"
-        signed_headers = "host;x-amz-content-sha256;x-amz-date"
-        canonical_request = "\n".join([method, canonical_uri, "", canonical_headers, signed_headers, payload_hash])
-        algorithm = "AWS4-HMAC-SHA256"
-        credential_scope = f"{date_stamp}/{region}/{service}/aws4_request"
-        string_to_sign = "\n".join([algorithm, amz_date, credential_scope, hashlib.sha256(canonical_request.encode()).hexdigest()])
-        signing_key = aws_v4_sign(self.R2_KEY_SECRET, date_stamp, region, service)
-        signature = hmac.new(signing_key, string_to_sign.encode(), hashlib.sha256).hexdigest()
-        authz = f"{algorithm} Credential={self.R2_KEY_ID}/{credential_scope}, SignedHeaders={signed_headers}, Signature={signature}"
-        headers = {
-            "Host": host,
-            "x-amz-date": amz_date,
-            "x-amz-content-sha256": payload_hash,
-            "Authorization": authz,
-            "Cache-Control": self.R2_CACHE,
-        }
+    def _build_s3_headers(self, method: str, key_path: str, payload: Optional[bytes] = None, content_type: Optional[str] = None,
+                          query: str = "", payload_hash: Optional[str] = None):
+        """Headers assinados para o R2. `payload_hash` evita re-hashear o corpo;
+        sem ele, usa UNSIGNED-PAYLOAD (se habilitado e sob HTTPS) ou o SHA-256 do payload."""
+        t0 = time.monotonic(); hashed = 0
+        if payload_hash is None:
+            if self._unsigned_payload():
+                payload_hash = UNSIGNED_PAYLOAD
+            else:
+                payload_hash = sha256_hex(payload or b""); hashed = len(payload or b"")
+        canonical_uri = f"/{self.R2_BUCKET}/{quote(key_path)}"  # mesmo encoding da URL enviada
+        headers = self.signer.sign(method, QUrl(self.R2_ENDPOINT).host(), canonical_uri, query, payload_hash)
+        headers["Cache-Control"] = self.R2_CACHE
         if content_type:
             headers["Content-Type"] = content_type
+        metrics.record("sign", (time.monotonic() - t0) * 1000, hashed, method=method)
         return headers
 
+    def _unsigned_payload(self) -> bool:
+        return self.R2_UNSIGNED_PAYLOAD and QUrl(self.R2_ENDPOINT).scheme() == "https"
+
     def _public_url_for(self, key_path: str) -> str:
         # sem bucket no caminho (estilo pub-xxxx.r2.dev)
         return f"{self.R2_PUBLIC_BASE}/{key_path}"
 
-    # ---------- Upload de 1 imagem ----------
-    def _put_one_image(self, item, on_done):
-        safe_name = item["filename"]
-        day = datetime.datetime.utcnow().strftime('%Y/%m/%d/')
-        key_path = f"{self.R2_PREFIX}{day}{item['sha']}-{uuid.uuid4().hex[:8]}-{safe_name}"
-        key_path = "/".join([p for p in key_path.split("/") if p])  # normaliza
-
-        url = QUrl(f"{self.R2_ENDPOINT}/{self.R2_BUCKET}/{quote(key_path)}")
-        req = QNetworkRequest(url)
-        req.setAttribute(QNetworkRequest.Http2AllowedAttribute, False)
-        cfg = QSslConfiguration.defaultConfiguration(); cfg.setProtocol(QSsl.TlsV1_2OrLater)
-        req.setSslConfiguration(cfg)
-
-        for k, v in self._build_s3_headers("PUT", key_path, item["data"], "image/png").items():
+    def _s3_send(self, method: str, key_path: str, params: dict, body: bytes, label: str = "",
+                 content_type: Optional[str] = None, payload_hash: Optional[str] = None, stage: Optional[str] = None) -> QNetworkReply:
+        """Requisição assinada genérica ao R2 (sub-recursos do S3 via `params`, ex.: ?uploads)."""
+        query = s3_canonical_query(params)
+        url = f"{self.R2_ENDPOINT}/{self.R2_BUCKET}/{quote(key_path)}" + (f"?{query}" if query else "")
+        req = self.transport.request(QUrl(url))
+        for k, v in self._build_s3_headers(method, key_path, body, content_type, query=query, payload_hash=payload_hash).items():
             req.setRawHeader(k.encode(), v.encode())
+        if stage == "put_part" and self.bandwidth.active:
+            buf = QBuffer(); buf.setData(body); buf.open(QIODevice.ReadOnly)
+            device = self._throttled_body(req, buf, len(body))
+            reply = self.nam.sendCustomRequest(req, method.encode(), device)
+            device.setParent(reply)
+        else:
+            reply = self.nam.sendCustomRequest(req, method.encode(), body if isinstance(body, QByteArray) else QByteArray(body))
+        return self.transport.track(reply, label or f"{method} {key_path}", len(body), stage=stage)
+
+    def _throttled_body(self, req: QNetworkRequest, source: QIODevice, size: int) -> QIODevice:
+        """Corpo de upload no ritmo do limite de banda global (sem buffer do QNAM)."""
+        req.setHeader(QNetworkRequest.ContentLengthHeader, size)
+        req.setAttribute(QNetworkRequest.DoNotBufferUploadDataAttribute, True)
+        if self.bandwidth.auto and not self._rtt_timer.isActive():
+            self._rtt_timer.start(); self._rtt_probe()
+        return ThrottledDevice(source, size, self.bandwidth)
+
+    def _rtt_probe(self):
+        """HEAD leve ao endereço público: o RTT sobe quando o uplink está enfileirando."""
+        if not (self.bandwidth.auto and self.upload_budget.in_use) or not self.R2_PUBLIC_BASE:
+            self._rtt_timer.stop(); return
+        t0 = time.monotonic()
+        reply = self.nam.head(self.transport.request(QUrl(self.R2_PUBLIC_BASE + "/")))
+        def done():
+            if reply.attribute(QNetworkRequest.HttpStatusCodeAttribute) is not None:
+                self.bandwidth.rtt_sample((time.monotonic() - t0) * 1000)
+            reply.deleteLater()
+        reply.finished.connect(done)
 
-        reply = self.nam.put(req, QByteArray(item["data"]))
+    # ---------- Upload de 1 imagem ----------
+    def _shares_objects(self, item: dict) -> bool:
+        return self.CONTENT_ADDRESSED and bool(item.get("sha256"))
 
-        def finished():
-            try:
-                if reply.error() == QNetworkReply.NoError:
-                    on_done(True, key_path, self._public_url_for(key_path), "")
-                else:
-                    on_done(False, key_path, "", reply.errorString())
-            finally:
-                reply.deleteLater()
-        reply.finished.connect(finished)
+    def _object_scope(self) -> str:
+        """Onde as chaves do índice por conteúdo valem: mesmo bucket e mesmo endereço público."""
+        return f"{self.R2_ENDPOINT}/{self.R2_BUCKET} {self.R2_PUBLIC_BASE}"
 
-    # ---------- Delete de 1 objeto ----------
-    def _delete_key(self, key_path: str, on_done):
-        url = QUrl(f"{self.R2_ENDPOINT}/{self.R2_BUCKET}/{quote(key_path)}")
-        req = QNetworkRequest(url)
-        req.setAttribute(QNetworkRequest.Http2AllowedAttribute, False)
-        cfg = QSslConfiguration.defaultConfiguration(); cfg.setProtocol(QSsl.TlsV1_2OrLater)
-        req.setSslConfiguration(cfg)
+    def _object_key(self, item: dict) -> str:
+        if self._shares_objects(item):
+            # Mesmo conteúdo, mesma chave: o objeto serve a qualquer orçamento que mande a imagem
+            key_path = f"{self.R2_PREFIX}cas/{item['sha256']}{os.path.splitext(item['filename'])[1].lower()}"
+        else:
+            day = datetime.datetime.utcnow().strftime('%Y/%m/%d/')
+            key_path = f"{self.R2_PREFIX}{day}{item['sha']}-{uuid.uuid4().hex[:8]}-{item['filename']}"
+        return "/".join([p for p in key_path.split("/") if p])  # normaliza
 
-        for k, v in self._build_s3_headers("DELETE", key_path, b"", None).items():
+    def _put_one_image(self, item, on_done):
+        key_path = self._object_key(item)
+
+        if self.MULTIPART_THRESHOLD and item["size"] > self.MULTIPART_THRESHOLD:
+            # Retorna o handle (tem abort()) no lugar do QNetworkReply
+            return MultipartUpload(self, item, key_path, on_done, self.MULTIPART_PART_SIZE,
+                                   min(3, self.UPLOAD_CONCURRENCY)).start()
+
+        # Retorna o handle com abort(); novas tentativas e hedge ficam por conta dele
+        return ResilientPut(self, item, key_path, on_done, self.PUT_MAX_ATTEMPTS, self._hedge_delay_ms()).start()
+
+    def _hedge_delay_ms(self) -> Optional[int]:
+        """Prazo do hedge: p95 dos PUTs recentes bem-sucedidos e sem hedge (None sem hedge ou sem amostras suficientes)."""
+        # Com limite de banda a cópia dividiria o mesmo balde de tokens: só atrasaria o original
+        if not self.HEDGE_PUTS or self.bandwidth.active or metrics.count("put") < self.HEDGE_MIN_SAMPLES: return None
+        return max(self.HEDGE_MIN_MS, int(metrics.percentile("put", 0.95)))
+
+    def _send_put(self, item: dict, key_path: str, hedge: bool = False) -> QNetworkReply:
+        """Uma tentativa de PUT do item (OSError se o spool não abrir)."""
+        body = open_item_device(item)                  # o Qt lê do spool sob demanda, sem cópia em Python
+        req = self.transport.request(QUrl(f"{self.R2_ENDPOINT}/{self.R2_BUCKET}/{quote(key_path)}"))
+        req.setHeader(QNetworkRequest.ContentLengthHeader, item["size"])
+        throttled = self.bandwidth.active
+        if throttled: body = self._throttled_body(req, body, item["size"])
+        payload_hash = UNSIGNED_PAYLOAD if self._unsigned_payload() else item.get("sha256")
+        for k, v in self._build_s3_headers("PUT", key_path, None, item.get("mime") or "image/png", payload_hash=payload_hash).items():
             req.setRawHeader(k.encode(), v.encode())
 
-        reply = self.nam.deleteResource(req)
+        label = f"PUT {item['filename']}" + (" (hedge)" if hedge else "")
+        # PUTs limitados ficam fora de "put": não puxam para baixo o p95 do hedge nem o ponto de partida do automático
+        stage = "put_hedge" if hedge else "put_throttled" if throttled else "put"
+        reply = self.transport.track(self.nam.put(req, body), label, item["size"], stage=stage)
+        body.setParent(reply)                          # fecha e libera junto com a reply
+        return reply
+
+    # ---------- Upload antecipado / compartilhado ----------
+    def _ensure_uploaded(self, item, on_done=None):
+        """Garante o objeto do item no R2, reaproveitando um upload antecipado.
+
+        Se o PUT já terminou, responde na hora; se está em voo, só aguarda o
+        mesmo PUT; se falhou ou nunca começou, dispara um novo.
+        """
+        up = item.get("upload")
+        if up and up["state"] == "done":
+            if on_done: on_done(True, up["key"], up["url"], "")
+            return
+        if up and up["state"] == "uploading":
+            if on_done: up["waiters"].append(on_done)
+            return
+        up = item["upload"] = {"state": "uploading", "key": "", "url": "", "reply": None, "waiters": [on_done] if on_done else []}
+        shared = self._shares_objects(item)
+
+        def finished(ok: bool, key_path: str, url: str, err: str):
+            up.update(state="done" if ok else "failed", key=key_path, url=url, reply=None)
+            if shared and self._shared_puts.get(item["sha256"]) is up: del self._shared_puts[item["sha256"]]
+            if ok and shared:
+                # Conta a referência deste item (removida durante o PUT: só indexa, sem referência)
+                self.journal.obj_put(self._object_scope(), item["sha256"], key_path, url, ref=not item.get("discarded"))
+                if key_path in self._pending_deletes:    # expirou e voltou a ser usado antes da limpeza
+                    self._pending_deletes.remove(key_path); self._save_pending_deletes()
+            if ok and not item.get("discarded"):
+                self.journal.mark_uploaded(item["token"], key_path, url)
+            if item.get("discarded") and key_path and not shared:
+                # Removida durante o PUT: o objeto pode ter chegado ao bucket mesmo com abort()
+                self._defer_deletes([key_path])
+            waiters, up["waiters"] = up["waiters"], []
+            for w in waiters: w(ok, key_path, url, err)
+
+        hit = self.journal.obj_get(self._object_scope(), item["sha256"]) if shared else None
+        if hit:
+            # Já está no bucket (outro orçamento mandou a mesma imagem): nenhum PUT
+            logger.info(f"Reaproveitando {hit['key']} ({item['filename']})")
+            finished(True, hit["key"], hit["url"], ""); return
+        if item.get("lost"):
+            finished(False, "", "", "arquivo temporário perdido"); return
+
+        def start(item, release):
+            if item.get("discarded"):
+                release(False, "", "", "Operation canceled"); return   # removida enquanto esperava slot
+            if shared:
+                key_path = self._object_key(item)
+                if key_path in self._deleting:
+                    # A limpeza em voo apagaria o objeto recém-enviado: o PUT sai depois dela
+                    self._after_deletes.append(lambda: start(item, release)); return
+                self._putting.add(key_path)
+                def release(ok, key, url, err, release=release):
+                    self._putting.discard(key_path); release(ok, key, url, err)
+            up["reply"] = self._put_one_image(item, release)
+
+        lead = self._shared_puts.get(item["sha256"]) if shared else None
+        if lead is not None:
+            # A mesma imagem já está subindo por outro item: aguarda aquele PUT (se ele falhar, sobe sozinha)
+            lead["waiters"].append(lambda ok, key_path, url, err: finished(ok, key_path, url, err) if ok
+                                   else self.upload_budget.run(start, item, finished))
+            return
+        if shared: self._shared_puts[item["sha256"]] = up
+        self.upload_budget.run(start, item, finished)   # slot global, dividido entre os orçamentos
+
+    def _pump_eager(self):
+        while self._eager_backlog and self._eager_in_flight < self.UPLOAD_CONCURRENCY:
+            item = self._eager_backlog.pop(0)
+            if item.get("discarded") or item.get("upload"): continue
+            self._eager_in_flight += 1
+            self._ensure_uploaded(item, lambda ok, key_path, url, err, name=item["filename"]: self._eager_settled(name, ok, url, err))
+
+    def _eager_settled(self, name: str, ok: bool, url: str, err: str):
+        self._eager_in_flight -= 1
+        if ok: logger.info(f"Upload antecipado OK: {url}")
+        else: logger.warning(f"Upload antecipado falhou ({name}): {err}")
+        self._pump_eager()
+
+    def _discard_upload(self, item):
+        """Item saiu da fila: cancela o PUT em voo ou agenda a exclusão do objeto já enviado."""
+        item["discarded"] = True
+        up = item.get("upload")
+        if not up: return
+        if up["state"] == "uploading" and up.get("reply") is not None:
+            up["reply"].abort()            # o callback de término agenda o DELETE da chave
+        elif up["state"] == "done":
+            keys = self.journal.obj_release(self._object_scope(), [up["key"]])   # objeto compartilhado só perde a referência
+            if keys: self._defer_deletes(keys)
+
+    # ---------- Delete em lote (S3 DeleteObjects) ----------
+    def _delete_keys_bulk(self, keys: List[str], on_done):
+        """Remove até DELETE_BATCH_MAX chaves num único POST ?delete.
+
+        `on_done(failed, retry)` recebe {key: erro} só com as chaves que não
+        saíram e o conjunto das que vale reenviar (falha transitória); se a
+        requisição inteira falhar, todas as chaves voltam como falha.
+        """
+        body = s3_delete_objects_body(keys)
+        req = self.transport.request(QUrl(f"{self.R2_ENDPOINT}/{self.R2_BUCKET}/?delete"))
+        for k, v in self._build_s3_headers("POST", "", body, "application/xml", query="delete=", payload_hash=sha256_hex(body)).items():
+            req.setRawHeader(k.encode(), v.encode())
+        req.setRawHeader(b"Content-MD5", base64.b64encode(hashlib.md5(body).digest()))
+
+        reply = self.transport.track(self.nam.post(req, QByteArray(body)), f"DeleteObjects ({len(keys)})", len(body), stage="delete")
         def finished():
             try:
-                if reply.error() == QNetworkReply.NoError:
-                    on_done(True, "")
-                else:
-                    on_done(False, reply.errorString())
+                if reply.error() != QNetworkReply.NoError:
+                    st = reply.attribute(QNetworkRequest.HttpStatusCodeAttribute)
+                    on_done({k: reply.errorString() for k in keys}, set(keys) if is_retryable(reply.error(), st) else set()); return
+                try:
+                    failed = s3_delete_objects_errors(bytes(reply.readAll()))
+                except ET.ParseError as e:
+                    failed = {k: f"resposta inválida: {e}" for k in keys}
+                    on_done(failed, set(keys)); return
+                failed = {k: v for k, v in failed.items() if k in keys}
+                on_done(failed, {k for k, v in failed.items() if v.split(":")[0] in RETRYABLE_S3_CODES})
             finally:
                 reply.deleteLater()
         reply.finished.connect(finished)
 
+    def _delete_keys_with_retry(self, keys: List[str], on_finished=None, attempt: int = 1):
+        """DeleteObjects em lotes; reenvia (backoff + jitter) apenas as chaves com falha transitória."""
+        batches = [keys[i:i + self.DELETE_BATCH_MAX] for i in range(0, len(keys), self.DELETE_BATCH_MAX)]
+        state = {"pending": len(batches), "failed": {}, "retry": set()}
+
+        def after_batch(failed: dict, retry: set):
+            state["failed"].update(failed); state["retry"] |= retry; state["pending"] -= 1
+            if state["pending"]: return
+            failed_keys = list(state["failed"])
+            retry_keys = [k for k in failed_keys if k in state["retry"]]
+            if retry_keys and attempt < self.DELETE_MAX_ATTEMPTS:
+                delay = backoff_delay(attempt, *self.DELETE_BACKOFF)
+                logger.warning(f"DeleteObjects: {len(retry_keys)} chave(s) falharam; nova tentativa {attempt+1}/{self.DELETE_MAX_ATTEMPTS} em {delay:.1f}s")
+                fatal = [k for k in failed_keys if k not in state["retry"]]
+                for k in fatal: logger.error(f"DELETE falhou ({k}): {state['failed'][k]}")
+                def retry_done(still_failed: List[str]):
+                    if on_finished: on_finished(fatal + still_failed)
+                QTimer.singleShot(int(delay * 1000), lambda: self._delete_keys_with_retry(retry_keys, retry_done, attempt + 1))
+                return
+            for k, err in state["failed"].items():
+                logger.error(f"DELETE falhou ({k}): {err}")
+            if on_finished: on_finished(failed_keys)
+
+        for batch in batches:
+            self._delete_keys_bulk(batch, after_batch)
+
+    # ---------- Exclusões adiadas ----------
+    def _defer_deletes(self, keys: List[str]):
+        self._pending_deletes.extend(k for k in keys if k not in self._pending_deletes)
+        self._save_pending_deletes()
+        if len(self._pending_deletes) >= self.DELETE_BATCH_MAX:
+            self._flush_pending_deletes()
+        else:
+            self._delete_flush_timer.start(self.DELETE_IDLE_MS)
+
+    def _flush_pending_deletes(self):
+        if not self._pending_deletes: return
+        if self._sends_in_progress:
+            # Não disputa a conexão com um envio em andamento
+            self._delete_flush_timer.start(self.DELETE_IDLE_MS); return
+        # Chave por conteúdo sendo reenviada agora: o DELETE apagaria o objeto novo, fica para depois
+        keys = [k for k in self._pending_deletes if k not in self._putting]
+        if not keys:
+            self._delete_flush_timer.start(self.DELETE_IDLE_MS); return
+        logger.info(f"Limpando {len(keys)} objeto(s) adiado(s) do bucket")
+        self._deleting.update(keys)
+
+        def flushed(failed_keys: List[str]):
+            self._deleting.difference_update(keys)
+            # Chaves que ainda falharam ficam para o próximo ciclo ocioso
+            self._pending_deletes = [k for k in self._pending_deletes if k not in keys or k in failed_keys]
+            self._save_pending_deletes()
+            if failed_keys or self._pending_deletes: self._delete_flush_timer.start(self.DELETE_IDLE_MS * (4 if failed_keys else 1))
+            waiting, self._after_deletes = self._after_deletes, []
+            for resume in waiting: resume()
+
+        self._delete_keys_with_retry(keys, flushed)
+
+    def _save_pending_deletes(self):
+        self.settings.setValue("r2_pending_deletes", json.dumps(self._pending_deletes))
+        self.settings.sync()
+
+    def _restore_pending_deletes(self):
+        try:
+            keys = json.loads(self.settings.value("r2_pending_deletes", "[]") or "[]")
+        except ValueError:
+            keys = []
+        if keys:
+            self._pending_deletes = [k for k in keys if isinstance(k, str)]
+            self._delete_flush_timer.start(self.DELETE_IDLE_MS)
+        self._expire_shared_objects()
+
+    def _expire_shared_objects(self):
+        """Objetos por conteúdo sem referência há mais que o TTL entram nas exclusões adiadas."""
+        keys = self.journal.obj_expire(self._object_scope(), self.REUSE_TTL_DAYS * 86400)
+        if keys:
+            logger.info(f"{len(keys)} imagem(ns) reaproveitável(is) expiraram; removendo do bucket")
+            self._defer_deletes(keys)
+
     # ---------- Orquestração: upload todos -> webhook -> (se OK) delete ----------
-    def _upload_all_and_send(self, client_name: str, phone: str, conversation_id: str):
-        items = list(self.image_queue)  # snapshot antes de limpar
+    def _upload_all_and_send(self, client_name: str, phone: str, conversation_id: str, items: List[dict], job_id: str):
         total = len(items)
-        self.status(f"Enviando {total} imagem(ns) ao S3…")
+        self._sends_in_progress += 1
+        self.status(f"Enviando {total} imagem(ns) ao S3 ({self.upload_budget.limit} por vez, entre todos os envios)…")
+        self._job_update(job_id, label=client_name or conversation_id, total=total, state=f"enviando 0/{total}", actions={})
+        done = {"n": 0}
 
-        self._idx = 0
-        self._keys: List[str] = []
-        self._urls: List[str] = []
-
-        def next_upload():
-            if self._idx >= total:
-                self.status("Upload concluído. Enviando links ao webhook…")
-                self._send_links_to_webhook(client_name, phone, conversation_id, self._urls, self._keys)
-                return
-            self.status(f"Upload {self._idx+1}/{total}…")
-            self._put_one_image(items[self._idx], after_upload)
-
-        def after_upload(ok: bool, key_path: str, url: str, err: str):
+        def after_upload(idx: int, ok: bool, key_path: str, url: str, err: str):
+            done["n"] += 1
             if ok:
-                self._keys.append(key_path); self._urls.append(url)
-                logger.info(f"Upload OK: {url}")
+                logger.info(f"Upload OK ({idx+1}/{total}): {url}")
             else:
-                logger.error(f"Upload falhou ({key_path}): {err}")
-            self._idx += 1; next_upload()
-
-        next_upload()
-
-    def _send_links_to_webhook(self, client_name: str, phone: str, conversation_id: str, urls: List[str], keys: List[str]):
+                logger.error(f"Upload falhou ({idx+1}/{total}, {key_path}): {err}")
+            self.status(f"Upload {done['n']}/{total}…")
+            self._job_update(job_id, state=f"enviando {done['n']}/{total}")
+
+        def all_settled(results):
+            self._sends_in_progress -= 1
+            failed = sum(1 for r in results if not (r and r[0]))
+            if failed == total:
+                self.status(f"Falha em {failed} de {total} upload(s). O orçamento ficou salvo e será retomado.")
+                self._job_done(job_id, f"falhou ({failed} de {total}); será retomado")
+                return
+            if failed:
+                # Sem o aceite do vendedor, nada de webhook com links faltando. A pergunta fica na
+                # lista de orçamentos (sem diálogo modal); até lá o job segue no diário e é retomado
+                self.status(f"Falha em {failed} de {total} upload(s). Decida pela lista de orçamentos (botão direito).")
+                self._job_update(job_id, state=f"{failed} de {total} falharam; aguardando decisão", actions={
+                    f"Enviar só as que subiram ({total - failed})": lambda: send_links(results, failed),
+                    "Tentar de novo as que falharam": lambda: self._upload_all_and_send(client_name, phone, conversation_id, items, job_id)})
+                return
+            send_links(results, failed)
+
+        def send_links(results, failed: int):
+            self._job_update(job_id, state="enviando links ao webhook", actions={})
+            # Mantém a ordem da fila (só os que subiram, se o envio parcial foi aceito)
+            ok_results = [r for r in results if r and r[0]]
+            keys = [r[1] for r in ok_results]
+            urls = [r[2] for r in ok_results]
+            self.status(f"Enviando {len(urls)} de {total} link(s) ao webhook…" if failed else "Upload concluído. Enviando links ao webhook…")
+            self._send_links_to_webhook(client_name, phone, conversation_id, urls, keys, job_id)
+
+        # Itens já enviados antecipadamente resolvem na hora; os em voo só são aguardados.
+        # O pool entrega tudo de uma vez ao orçamento global (FIFO): quem limita é ele, e
+        # as imagens deste envio ficam à frente das do próximo
+        pool = UploadPool(items, self._ensure_uploaded, max(1, total), on_item=after_upload, on_all_done=all_settled)
+        pool.run()
+
+    def _send_links_to_webhook(self, client_name: str, phone: str, conversation_id: str, urls: List[str], keys: List[str], job_id: str):
         if not self.WEBHOOK_URL:
             self.status("Webhook não configurado."); return
 
         payload = {"client_name": client_name or "", "phone": phone or "", "conversation_id": conversation_id, "images": urls}
-        req = QNetworkRequest(QUrl(self.WEBHOOK_URL))
-        req.setHeader(QNetworkRequest.ContentTypeHeader, 'application/json')
-        reply = self.nam.post(req, json.dumps(payload).encode("utf-8"))
+        self.outbox.enqueue(job_id, self.WEBHOOK_URL, json.dumps(payload).encode("utf-8"))
+
+    @Slot(str)
+    def _on_webhook_delivered(self, job_id: str):
+        self.journal.set_job_state(job_id, "webhook_sent")
+        keys = self.journal.job_keys(job_id)
+        self.status(f"Orçamento enviado com {len(keys)} link(s). Limpando arquivos temporários…")
+        self._job_update(job_id, state="enviado; limpando")
+        self._delete_after_webhook(keys, job_id)
+
+    @Slot(str, int, float, str)
+    def _on_webhook_retry(self, job_id: str, attempt: int, delay: float, err: str):
+        logger.warning(f"Webhook falhou (tentativa {attempt}): {err}; nova tentativa em {delay:.0f}s")
+        self.status(f"Falha no webhook; nova tentativa em {delay:.0f}s…")
+        self._job_update(job_id, state=f"webhook: nova tentativa em {delay:.0f}s")
+        if not self._probe_timer.isActive(): self._probe_timer.start()
+
+    @Slot(str, str)
+    def _on_webhook_gave_up(self, job_id: str, err: str):
+        # Estado terminal: a retomada não reenvia sozinha; o vendedor decide pela lista de orçamentos
+        logger.error(f"Webhook desistiu ({job_id}): {err}")
+        self.journal.set_job_state(job_id, "webhook_failed")
+        self.status(f"Falha no webhook: {err}")
+        job = self.journal.job(job_id)
+        if job is None: return
+        # O job pode não ter linha na lista (retomado só para a caixa de saída entregar)
+        self._park_failed_webhook(job_id, job["client_name"] or job["conversation_id"], len(job["items"]))
+
+    def _park_failed_webhook(self, job_id: str, label: Optional[str] = None, total: Optional[int] = None):
+        self._job_update(job_id, label=label, total=total, state="falha no webhook (botão direito)", actions={
+            "Reenviar ao webhook": lambda: self._retry_webhook(job_id),
+            "Descartar orçamento": lambda: self._discard_job(job_id)})
+
+    def _retry_webhook(self, job_id: str):
+        job = self.journal.job(job_id)
+        if job is None: return
+        rows = [r for r in job["items"] if r["url"]]
+        self.journal.set_job_state(job_id, "uploading")   # com a linha na caixa de saída, a retomada só aguarda
+        self._job_update(job_id, state="enviando links ao webhook", actions={})
+        self._send_links_to_webhook(job["client_name"], job["phone"], job["conversation_id"],
+                                    [r["url"] for r in rows], [r["key"] for r in rows], job_id)
+
+    def _discard_job(self, job_id: str):
+        job = self.journal.job(job_id)
+        if job is None: return
+        self._job_update(job_id, state="descartado; limpando", actions={})
+        self._delete_after_webhook([r["key"] for r in job["items"] if r["key"]], job_id)
+
+    # ---------- Lista de orçamentos em andamento ----------
+    JOB_LINGER_MS = 5000           # tempo que um orçamento encerrado continua visível
+
+    def _job_update(self, job_id: str, label: Optional[str] = None, total: Optional[int] = None, state: str = "",
+                    actions: Optional[dict] = None):
+        """Atualiza a linha do job; `actions` (rótulo -> callback) vira o menu de contexto dela."""
+        job = self._jobs.get(job_id)
+        if job is None:
+            if label is None: return      # job sem vitrine (ex.: limpeza retomada do diário)
+            job = self._jobs[job_id] = {"label": label or job_id[:6], "total": total or 0, "state": "",
+                                        "row": QListWidgetItem(), "actions": {}}
+            self.jobs_list.addItem(job["row"]); self.jobs_list.show()
+        if total is not None: job["total"] = total
+        if state: job["state"] = state
+        if actions is not None: job["actions"] = actions
+        job["row"].setText(f"{job['label']} · {job['total']} img · {job['state']}")
+
+    def _job_done(self, job_id: str, state: str):
+        if job_id not in self._jobs: return
+        self._job_update(job_id, state=state, actions={})
+        QTimer.singleShot(self.JOB_LINGER_MS, lambda: self._job_remove(job_id))
+
+    def _jobs_context_menu(self, pos: QPoint):
+        row = self.jobs_list.itemAt(pos)
+        job = next((j for j in self._jobs.values() if j["row"] is row), None) if row else None
+        if not job or not job["actions"]: return
+        menu = QMenu(self)
+        for label, callback in job["actions"].items(): menu.addAction(label, callback)
+        menu.exec(self.jobs_list.viewport().mapToGlobal(pos))
+
+    def _job_remove(self, job_id: str):
+        job = self._jobs.pop(job_id, None)
+        if job is None: return
+        self.jobs_list.takeItem(self.jobs_list.row(job["row"]))
+        self.jobs_list.setVisible(bool(self._jobs))
+
+    def _delete_after_webhook(self, keys: List[str], job_id: str):
+        # Objetos por conteúdo só perdem a referência; saem do bucket pelo TTL
+        keys = self.journal.obj_release(self._object_scope(), keys, job_id)
+        self._expire_shared_objects()
+        if not keys or self.DELETE_DEFERRED:
+            # Chaves adiadas ficam persistidas à parte; o job já pode sair do diário
+            if keys: self._defer_deletes(keys)
+            self.journal.finish_job(job_id); self._job_done(job_id, "concluído")
+            self.status("Concluído."); return
 
-        def done():
-            try:
-                st = reply.attribute(QNetworkRequest.HttpStatusCodeAttribute)
-                ok = (reply.error() == QNetworkReply.NoError) and (st is None or st < 400)
-                if ok:
-                    self.status(f"Orçamento enviado com {len(urls)} link(s). Limpando arquivos temporários…")
-                    self._delete_after_webhook(keys)
-                else:
-                    self.status(f"Falha no webhook: {reply.errorString()} (HTTP {st})")
-            finally:
-                reply.deleteLater()
-        reply.finished.connect(done)
+        def deleted(failed_keys: List[str]):
+            if failed_keys:
+                # Não se perde: entram na fila adiada para nova tentativa quando ocioso
+                self._defer_deletes(failed_keys)
+            self.journal.finish_job(job_id); self._job_done(job_id, "concluído")
+            self.status("Concluído.")
 
-    def _delete_after_webhook(self, keys: List[str]):
-        if not keys:
-            self.status("Concluído."); return
-        self._del_idx = 0; total = len(keys)
+        self.status(f"Removendo {len(keys)} objeto(s)…")
+        self._delete_keys_with_retry(keys, deleted)
 
-        def next_del():
-            if self._del_idx >= total:
-                self.status("Concluído."); return
-            key = keys[self._del_idx]
-            self.status(f"Removendo {self._del_idx+1}/{total}…")
-            self._delete_key(key, after_del)
+    # ---------- Retomada a partir do diário ----------
+    def _item_from_journal(self, row: dict) -> dict:
+        try:
+            size = os.path.getsize(row["path"])       # os bytes continuam no spool; lidos só no upload
+        except OSError:
+            size = 0
+        item = {"token": row["token"], "filename": row["filename"], "data": None, "size": size, "sha": (row["sha256"] or "")[:8],
+                "sha256": row["sha256"], "mime": row["mime"], "path": row["path"], "pending": False,
+                "job": row["job_id"], "pos": row["pos"]}
+        if not size and row["state"] != "uploaded":
+            item["lost"] = True  # sem bytes e sem objeto no R2: conta como upload falho, não some do orçamento
+        if row["state"] == "uploaded":
+            item["upload"] = {"state": "done", "key": row["key"], "url": row["url"], "reply": None, "waiters": []}
+        return item
+
+    def _resume_journal(self):
+        self.journal.purge_orphan_spool()
+        resumed = 0
+        for job in self.journal.jobs():
+            items = [self._item_from_journal(r) for r in job["items"]]
+            if job["state"] == "draft":
+                if job["id"] != self._draft_id: continue
+                for item in items:
+                    if item.get("lost"): self.journal.remove_item(item["token"])   # ainda não era orçamento: só sai da fila
+                    else: self._restore_queue_item(item)
+                self._item_pos = max([self._item_pos] + [i["pos"] + 1 for i in items])
+            elif job["state"] == "uploading" and self.outbox.has_job(job["id"]):
+                continue  # uploads completos; a caixa de saída cuida do webhook
+            elif job["state"] == "uploading" and items:
+                resumed += 1
+                logger.info(f"Retomando envio {job['id']} ({len(items)} imagem(ns))")
+                self._upload_all_and_send(job["client_name"], job["phone"], job["conversation_id"], items, job["id"])
+            elif job["state"] == "webhook_failed":
+                self._park_failed_webhook(job["id"], job["client_name"] or job["conversation_id"], len(job["items"]))
+            elif job["state"] == "webhook_sent":
+                resumed += 1
+                self._delete_after_webhook([r["key"] for r in job["items"] if r["key"]], job["id"])
+            else:
+                self.journal.finish_job(job["id"])
+        if resumed:
+            self.status(f"Retomando {resumed} envio(s) interrompido(s)…")
+        if self.outbox.pending_count():
+            self._probe_timer.start(); self.outbox.pump()
 
-        def after_del(ok: bool, err: str):
-            if not ok:
-                logger.error(f"DELETE falhou: {err}")
-            self._del_idx += 1; next_del()
+    def _restore_queue_item(self, item: dict):
+        if not self.image_queue: self.hint_label.hide()
+        self.queue_model.append(item)
+        thumb = self.thumbs.get(item["sha256"])        # cache: sem decodificar o original
+        if thumb is not None: self.queue_model.set_thumbnail(item["token"], thumb)
+        self.update_queue_label()
+        if thumb is None and item.get("path"):
+            task = ThumbnailTask(item["token"], item["path"], item["sha256"], self.thumbs)
+            task.signals.done.connect(self._on_thumbnail); task.signals.failed.connect(self._on_thumbnail_failed)
+            self._thumb_tasks[item["token"]] = task
+            self._encode_pool.start(task)
 
-        next_del()
+    @Slot(str, object)
+    def _on_thumbnail(self, token: str, result: dict):
+        self._thumb_tasks.pop(token, None)
+        if self.queue_model.row_of(token) >= 0: self.queue_model.set_thumbnail(token, result["thumb"])
+
+    @Slot(str, str)
+    def _on_thumbnail_failed(self, token: str, err: str):
+        self._thumb_tasks.pop(token, None)
 
     def send_queue(self):
         if not self.WEBHOOK_URL or not self.SELLER_NAME:
@@ -694,8 +2744,28 @@ class FloatingWidget(QWidget):
             self.status("Preencha o ID da Conversa."); return
         client_name = self.client_name.text().strip()
         phone = self.phone.text().strip()
-        self._upload_all_and_send(client_name, phone, conversation_id)
-        self.clear_queue()
+        items = list(self.image_queue)  # snapshot antes de limpar
+        self.clear_queue(discard=False)
+
+        # O rascunho vira o job deste envio; a fila passa a gravar num rascunho novo
+        job_id = self._draft_id
+        for i, item in enumerate(items): item["pos"] = i
+        self.journal.start_job(job_id, client_name, phone, conversation_id, [i["token"] for i in items])
+        self._draft_id = self.journal.new_draft(); self._item_pos = 0
+
+        pending = sum(1 for i in items if i.get("pending"))
+        self._job_update(job_id, label=client_name or conversation_id, total=len(items),
+                         state="processando imagens…" if pending else "na fila")
+        if pending:
+            self.status(f"Aguardando {pending} imagem(ns) terminarem de processar…")
+
+        def ready(encoded: List[dict]):
+            if not encoded:
+                self.journal.finish_job(job_id); self._job_done(job_id, "sem imagens válidas")
+                self.status("Nenhuma imagem válida para enviar."); return
+            self._upload_all_and_send(client_name, phone, conversation_id, encoded, job_id)
+
+        self._when_encoded(items, ready)
 
 # ===================== Execução =====================
 if __name__ == "__main__":